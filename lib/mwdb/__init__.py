@@ -26,6 +26,7 @@ from . import orm
 from . import mediawiki
 
 from .mediawiki.wikipedia import Wikipedia
+from .mediawiki.asyncwikipedia import AsyncWikipedia
 
 
 class NullHandler(logging.Handler):
@@ -32,3 +32,55 @@ class TableError(MWDBError):
 
 class IndexError(MWDBError):
     pass
+
+
+class MapError(MWDBError):
+    """Raised if some page ranges of a parallel map could not be processed.
+
+    :ivar failed:   List of (min_id, max_id, message) tuples of the failed
+                    page id ranges
+    :type failed:   list
+
+    :ivar result:   Combined result of all successful ranges
+    """
+
+    def __init__(self, message, failed=None, result=None):
+        super(MapError, self).__init__(message)
+        self.failed = failed or []
+        self.result = result
+
+
+class ConnectionLimitError(MWDBError):
+    """Raised if no connection became available within the checkout timeout"""
+
+
+class TextError(MWDBError):
+    """Raised if a stored text cannot be decoded.
+
+    :ivar text_id:  Id of the text (old_id) or None if unknown
+    :type text_id:  int
+
+    :ivar flags:    Value of old_flags
+    :type flags:    string
+    """
+
+    def __init__(self, message, text_id=None, flags=None):
+        super(TextError, self).__init__(message)
+        self.text_id = text_id
+        self.flags = flags
+
+
+class DumpImportError(MWDBError):
+    """Raised if parts of a dump import failed.
+
+    :ivar errors:   Error messages of failed dumps and batches
+    :type errors:   list
+
+    :ivar counts:   Number of imported rows per table
+    :type counts:   dict
+    """
+
+    def __init__(self, message, errors=None, counts=None):
+        super(DumpImportError, self).__init__(message)
+        self.errors = errors or []
+        self.counts = counts or {}
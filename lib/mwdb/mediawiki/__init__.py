@@ -17,7 +17,11 @@
 # You should have received a copy of the GNU General Public License
 # along with mwdb. If not, see <http://www.gnu.org/licenses/>.
 
+from . import asyncwikipedia
+from . import categorytree
+from . import graph
 from . import markup
 from . import pages
+from . import parallel
 from . import text
 from . import wikipedia
@@ -0,0 +1,309 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""asyncio front-end for Wikipedia lookups.
+
+The blocking lookups of mwdb.Wikipedia run in a pool of executor threads, so
+they never block the event loop. All methods return awaitables.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import functools
+import itertools
+import logging
+import threading
+
+import mwdb
+
+try:
+    import asyncio
+    import concurrent.futures as futures
+except ImportError as imp_err:
+    asyncio = None
+    futures = None
+
+from . import pages
+
+_log = logging.getLogger(__name__)
+
+
+class _AsyncPageIterator(object):
+    """Asynchronous iterator over a blocking page scan.
+
+    The scan is created and read in the executor of the owning
+    AsyncWikipedia, a batch at a time. Every batch is read with a session of
+    its own, so pages are detached once they are handed out.
+    """
+
+    def __init__(self, owner, factory, batch_size):
+        self._owner = owner
+        self._factory = factory
+        self._iterator = None
+        self._batch_size = batch_size
+        self._buffer = collections.deque()
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        if not self._buffer:
+            return self._owner._run(self._next_page)
+
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(self._buffer.popleft())
+        return future
+
+    def _next_page(self):
+        """Next page, the next batch is read if the buffer is empty"""
+        if self._iterator is None:
+            self._iterator = iter(self._factory() or ())
+
+        if not self._buffer:
+            self._buffer.extend(
+                itertools.islice(self._iterator, self._batch_size))
+
+        if not self._buffer:
+            raise StopAsyncIteration()
+
+        return self._buffer.popleft()
+
+
+class AsyncWikipedia(object):
+    """Wikipedia in a single language for asyncio applications.
+
+    Lookups run in executor threads. Every lookup uses a private session
+    that is closed when the lookup is done, so the sessions of the language
+    databases are never touched and no connection is held between lookups.
+    Pages are detached once they are returned, so relations have to be
+    loaded with load profiles instead of lazily from the event loop.
+
+    Connections returned to the pools of the language databases stay open
+    until the limit of mwdb.databases.max_connections closes them.
+    """
+
+    def __init__(self, language, max_workers=4, executor=None,
+                 max_connections=None):
+        """Constructor.
+
+        :param language:        Language code
+        :type language:         string
+
+        :param max_workers:     Number of threads of the executor
+        :type max_workers:      int
+
+        :param executor:        Executor to run lookups in instead of a new
+                                thread pool
+        :type executor:         concurrent.futures.Executor
+
+        :param max_connections: Maximum number of connections used by the
+                                lookups of this instance at the same time.
+                                Defaults to max_workers.
+        :type max_connections:  int
+        """
+        if asyncio is None:
+            raise ImportError('AsyncWikipedia requires asyncio')
+
+        self.language = language
+        self.max_workers = max_workers
+        self.max_connections = max_connections or max_workers
+
+        self._wikipedia = mwdb.Wikipedia(language)
+        self._executor = executor or futures.ThreadPoolExecutor(max_workers)
+        self._connections = threading.BoundedSemaphore(self.max_connections)
+
+    def __repr__(self):
+        return 'AsyncWikipedia({0.language})'.format(self)
+
+    def _call(self, language, func, *args, **kwargs):
+        """Call func with a private session of language.
+
+        Executor threads wait for a free connection first, so a shared
+        executor with more threads does not open more connections.
+        """
+        lang_db = mwdb.databases.get_database(language)
+
+        if lang_db is None:
+            return func(*args, **kwargs)
+
+        with self._connections:
+            with lang_db.checkout_session():
+                return func(*args, **kwargs)
+
+    def _run_in(self, language, func, *args, **kwargs):
+        """Run a blocking function for language in the executor"""
+        return asyncio.get_event_loop().run_in_executor(
+            self._executor, functools.partial(self._call, language, func,
+                                              *args, **kwargs))
+
+    def _run(self, func, *args, **kwargs):
+        """Run a blocking function in the executor"""
+        return self._run_in(self.language, func, *args, **kwargs)
+
+    def close(self):
+        """Shut down the executor without waiting for running lookups.
+
+        No session outlives the lookup it was opened for, running lookups
+        close their sessions when they are done.
+        """
+        self._executor.shutdown(wait=False)
+
+    def get_article(self, title, follow_redirects=False):
+        """Awaitable article with given title (see Wikipedia.get_article)"""
+        return self._run(self._wikipedia.get_article, title, follow_redirects)
+
+    def get_category(self, title):
+        """Awaitable category with given title"""
+        return self._run(self._wikipedia.get_category, title)
+
+    def get_articles(self, titles, chunk_size=None, follow_redirects=False):
+        """Awaitable title -> article mapping (see Wikipedia.get_articles)"""
+        return self._run(self._wikipedia.get_articles, list(titles),
+                         chunk_size, follow_redirects)
+
+    def get_categories(self, titles, chunk_size=None):
+        """Awaitable title -> category mapping"""
+        return self._run(self._wikipedia.get_categories, list(titles),
+                         chunk_size)
+
+    def iter_articles(self, batch_size=500, load=None):
+        """Asynchronous article iterator for use with ``async for``.
+
+        Every batch is read with a session of its own, which is closed
+        before the articles are handed out, so memory does not grow with
+        the number of articles.
+
+        :param batch_size:  Number of articles fetched at once
+        :type batch_size:   int
+
+        :param load:        Loading profiles (see wikipedia.load_profiles)
+        :type load:         sequence
+        """
+        return _AsyncPageIterator(
+            self, functools.partial(self._wikipedia.scan_articles, batch_size,
+                                    load=load),
+            batch_size)
+
+    def iter_categories(self, batch_size=500, load=None):
+        """Asynchronous category iterator for use with ``async for``"""
+        return _AsyncPageIterator(
+            self, functools.partial(self._wikipedia.scan_categories,
+                                    batch_size, load=load),
+            batch_size)
+
+    def _translation_titles(self, page):
+        """Titles of the translations of page grouped by language.
+
+        The page is merged into the private session of the lookup, so its
+        language links can be loaded.
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+        page = lang_db.session.merge(page, load=False)
+
+        titles = {}
+        for ll in page.language_links:
+            lang = ll.lang.replace('-', '_')
+            if lang in mwdb.databases.languages:
+                titles.setdefault(lang, []).append(ll.title)
+
+        return titles
+
+    def gather_translations(self, page, timeout=None):
+        """Awaitable list of translations of given page.
+
+        The languages are queried concurrently in the executor of this
+        instance. Translations are ordered by language and, within a
+        language, in the order of the language links.
+
+        :param page:    Article or Category of this language
+        :type page:     mwdb.mediawiki.pages.Page
+
+        :param timeout: Seconds to wait for the languages, counted from this
+                        call. Languages that take longer are skipped.
+        :type timeout:  float
+        """
+        loop = asyncio.get_event_loop()
+        result = loop.create_future()
+
+        deadline = None
+        if timeout is not None:
+            deadline = loop.time() + timeout
+
+        if isinstance(page, pages.Category):
+            method_name = 'get_categories'
+        else:
+            method_name = 'get_articles'
+
+        def lookups_done(lookups, titles):
+            if result.cancelled():
+                return
+
+            translations = []
+            for lang, future in lookups:
+                if not future.done():
+                    _log.warning('{0}: Translation lookup timed out'.format(
+                        lang))
+                    future.cancel()
+                    continue
+
+                if future.cancelled():
+                    continue
+
+                if future.exception() is not None:
+                    result.set_exception(future.exception())
+                    return
+
+                found = future.result() or {}
+                translations.extend(found[title] for title in titles[lang]
+                                    if found.get(title))
+
+            result.set_result(translations)
+
+        def titles_done(titles_future):
+            if result.cancelled():
+                return
+            if titles_future.exception() is not None:
+                result.set_exception(titles_future.exception())
+                return
+
+            titles = titles_future.result()
+            lookups = [(lang, self._run_in(
+                            lang, lambda lang=lang: getattr(
+                                mwdb.Wikipedia(lang), method_name)(
+                                    titles[lang])))
+                       for lang in sorted(titles)]
+
+            if not lookups:
+                result.set_result([])
+                return
+
+            wait = None
+            if deadline is not None:
+                wait = max(deadline - loop.time(), 0)
+
+            waiter = asyncio.ensure_future(asyncio.wait(
+                [future for lang, future in lookups], timeout=wait))
+            waiter.add_done_callback(
+                lambda waiter: lookups_done(lookups, titles))
+
+        self._run(self._translation_titles, page).add_done_callback(
+            titles_done)
+        return result
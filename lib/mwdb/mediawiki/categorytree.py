@@ -0,0 +1,272 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""Traversal of the category graph.
+
+On PostgreSQL the category graph is traversed with a single WITH RECURSIVE
+query. Other databases are traversed breadth first with one query per level
+(and chunk of categories).
+
+The Wikipedia category graph contains cycles. Every row of the recursive
+queries carries the path of categories it was reached through, and a
+category is never followed back into its own path, so cycles are not
+expanded again. Every category is reported at its smallest depth. The
+breadth first traversal keeps a set of visited categories.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import logging
+
+from sqlalchemy import and_, select, text
+
+_log = logging.getLogger(__name__)
+
+# depth limit used if no depth is given
+max_category_depth = 32
+
+# number of categories queried at once by the breadth first traversal
+level_chunk_size = 1000
+
+_descendants_cte = '''
+WITH RECURSIVE tree(page_id, page_title, depth, path) AS (
+    SELECT p.page_id, p.page_title, 1, ARRAY[p.page_id]
+    FROM categorylinks cl
+    JOIN page p ON p.page_id = cl.cl_from
+    WHERE cl.cl_to = :root_title
+      AND p.page_namespace = 14
+      AND p.page_id <> :root_id
+      AND :max_depth > 0
+  UNION ALL
+    SELECT p.page_id, p.page_title, t.depth + 1, t.path || p.page_id
+    FROM tree t
+    JOIN categorylinks cl ON cl.cl_to = t.page_title
+    JOIN page p ON p.page_id = cl.cl_from
+    WHERE p.page_namespace = 14
+      AND p.page_id <> :root_id
+      AND NOT p.page_id = ANY(t.path)
+      AND t.depth < :max_depth
+)
+'''
+
+_descendants_sql = _descendants_cte + '''
+SELECT page_id, min(depth) AS min_depth
+FROM tree
+GROUP BY page_id
+ORDER BY min_depth, page_id
+'''
+
+_ancestors_sql = '''
+WITH RECURSIVE tree(page_id, depth, path) AS (
+    SELECT p.page_id, 1, ARRAY[p.page_id]
+    FROM categorylinks cl
+    JOIN page p ON p.page_namespace = 14 AND p.page_title = cl.cl_to
+    WHERE cl.cl_from = :root_id
+      AND p.page_id <> :root_id
+      AND :max_depth > 0
+  UNION ALL
+    SELECT p.page_id, t.depth + 1, t.path || p.page_id
+    FROM tree t
+    JOIN categorylinks cl ON cl.cl_from = t.page_id
+    JOIN page p ON p.page_namespace = 14 AND p.page_title = cl.cl_to
+    WHERE p.page_id <> :root_id
+      AND NOT p.page_id = ANY(t.path)
+      AND t.depth < :max_depth
+)
+SELECT page_id, min(depth) AS min_depth
+FROM tree
+GROUP BY page_id
+ORDER BY min_depth, page_id
+'''
+
+_member_pages_sql = _descendants_cte + ''',
+categories(page_title) AS (
+    SELECT CAST(:root_title AS text)
+  UNION
+    SELECT page_title FROM tree
+)
+SELECT DISTINCT p.page_id
+FROM categories c
+JOIN categorylinks cl ON cl.cl_to = c.page_title
+JOIN page p ON p.page_id = cl.cl_from
+WHERE p.page_namespace = 0
+ORDER BY p.page_id
+'''
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def descendants(lang_db, category, max_depth=None):
+    """Get all subcategories of a category down to given depth.
+
+    :return:    List of (page_id, depth) tuples ordered by depth
+    :rtype:     list
+    """
+    if max_depth is None:
+        max_depth = max_category_depth
+
+    session = lang_db.session
+
+    if lang_db.vendor == 'postgresql':
+        return [tuple(row) for row in session.execute(
+            text(_descendants_sql),
+            {'root_id': category.id, 'root_title': category.title,
+             'max_depth': max_depth})]
+
+    return [(page_id, depth) for page_id, title, depth in
+            _walk_down(lang_db, category, max_depth)]
+
+
+def _walk_down(lang_db, category, max_depth):
+    """Breadth first traversal of the subcategories of a category.
+
+    :return:    List of (page_id, page_title, depth) tuples ordered by depth
+    """
+    session = lang_db.session
+    pages = lang_db.get_table('page')
+    catlinks = lang_db.get_table('categorylinks')
+    visited = set([category.id])
+    found = []
+    level = [category.title]
+    depth = 0
+
+    while level and depth < max_depth:
+        depth += 1
+        next_level = []
+
+        for chunk in _chunks(level, level_chunk_size):
+            for page_id, title in session.execute(select(
+                [pages.c.page_id, pages.c.page_title],
+                and_(catlinks.c.cl_to.in_(chunk),
+                     pages.c.page_id == catlinks.c.cl_from,
+                     pages.c.page_namespace == 14))):
+                if page_id not in visited:
+                    visited.add(page_id)
+                    found.append((page_id, title, depth))
+                    next_level.append(title)
+
+        level = next_level
+
+    return found
+
+
+def ancestors(lang_db, category, max_depth=None):
+    """Get all supercategories of a category up to given depth.
+
+    :return:    List of (page_id, depth) tuples ordered by depth
+    :rtype:     list
+    """
+    if max_depth is None:
+        max_depth = max_category_depth
+
+    session = lang_db.session
+
+    if lang_db.vendor == 'postgresql':
+        return [tuple(row) for row in session.execute(
+            text(_ancestors_sql),
+            {'root_id': category.id, 'max_depth': max_depth})]
+
+    pages = lang_db.get_table('page')
+    catlinks = lang_db.get_table('categorylinks')
+    visited = set([category.id])
+    found = []
+    level = [category.id]
+    depth = 0
+
+    while level and depth < max_depth:
+        depth += 1
+        next_level = []
+
+        for chunk in _chunks(level, level_chunk_size):
+            for page_id, in session.execute(select(
+                [pages.c.page_id],
+                and_(catlinks.c.cl_from.in_(chunk),
+                     pages.c.page_namespace == 14,
+                     pages.c.page_title == catlinks.c.cl_to))):
+                if page_id not in visited:
+                    visited.add(page_id)
+                    found.append((page_id, depth))
+                    next_level.append(page_id)
+
+        level = next_level
+
+    return found
+
+
+def member_page_ids(lang_db, category, max_depth=None):
+    """Get ids of all articles in a category and its subcategories.
+
+    :return:    Sorted list of page ids
+    :rtype:     list
+    """
+    if max_depth is None:
+        max_depth = max_category_depth
+
+    session = lang_db.session
+
+    if lang_db.vendor == 'postgresql':
+        return [row[0] for row in session.execute(
+            text(_member_pages_sql),
+            {'root_id': category.id, 'root_title': category.title,
+             'max_depth': max_depth})]
+
+    pages = lang_db.get_table('page')
+    catlinks = lang_db.get_table('categorylinks')
+    titles = [category.title]
+    titles.extend(title for page_id, title, depth in
+                  _walk_down(lang_db, category, max_depth))
+
+    page_ids = set()
+    for chunk in _chunks(titles, level_chunk_size):
+        page_ids.update(row[0] for row in session.execute(select(
+            [pages.c.page_id],
+            and_(catlinks.c.cl_to.in_(chunk),
+                 pages.c.page_id == catlinks.c.cl_from,
+                 pages.c.page_namespace == 0))))
+
+    return sorted(page_ids)
+
+
+def iter_pages(lang_db, cls, page_ids, chunk_size=None):
+    """Load pages of given class in the order of the given ids.
+
+    :param lang_db:     Database of the language
+    :type lang_db:      mwdb.orm.database.Database
+
+    :param cls:         Mapped page class
+    :type cls:          class
+
+    :param page_ids:    Page ids
+    :type page_ids:     list
+    """
+    if chunk_size is None:
+        chunk_size = level_chunk_size
+
+    session = lang_db.session
+
+    for chunk in _chunks(page_ids, chunk_size):
+        loaded = dict((page.id, page) for page in
+                      session.query(cls).filter(cls.id.in_(chunk)))
+        for page_id in chunk:
+            if page_id in loaded:
+                yield loaded[page_id]
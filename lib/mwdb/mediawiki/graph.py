@@ -0,0 +1,334 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""Compact article link graph.
+
+Articles are numbered densely from 0 in page id order. Outgoing and incoming
+links are stored in compressed sparse row (CSR) form: the links of article i
+are targets[offsets[i]:offsets[i + 1]].
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import with_statement
+
+import array
+import io
+import logging
+import os
+import struct
+import sys
+import tempfile
+
+import mwdb
+
+from sqlalchemy import and_, select
+
+try:
+    import numpy
+except ImportError as imp_err:
+    numpy = None
+
+_log = logging.getLogger(__name__)
+
+# file header: magic, number of articles, number of links
+_magic = b'MWDBCSR1'
+_header = struct.Struct(str('<8sqq'))
+
+
+def _int32_array(values=()):
+    """New array of signed 32 bit integers"""
+    return array.array(str('i'), values)
+
+
+def _csr(size, sources, targets):
+    """Build CSR offsets and targets from two parallel edge arrays.
+
+    :return:    (offsets, targets) tuple
+    """
+    if numpy is not None:
+        sources = numpy.asarray(sources, dtype=numpy.int32)
+        targets = numpy.asarray(targets, dtype=numpy.int32)
+        order = numpy.argsort(sources, kind='mergesort')
+        offsets = numpy.zeros(size + 1, dtype=numpy.int32)
+        # bincount counts in 64 bit integers
+        offsets[1:] = numpy.cumsum(
+            numpy.bincount(sources, minlength=size)).astype(numpy.int32)
+        return offsets, targets[order]
+
+    # counting sort
+    offsets = _int32_array([0]) * (size + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+
+    sorted_targets = _int32_array([0]) * len(targets)
+    positions = offsets[:-1]
+    for source, target in zip(sources, targets):
+        sorted_targets[positions[source]] = target
+        positions[source] += 1
+
+    return offsets, sorted_targets
+
+
+class LinkGraph(object):
+    """Link graph of all articles of a language.
+
+    :ivar page_ids:     Page id of every article
+    :ivar titles:       Title of every article
+    :ivar out_offsets:  CSR offsets of outgoing links
+    :ivar out_targets:  CSR targets of outgoing links
+    :ivar in_offsets:   CSR offsets of incoming links
+    :ivar in_targets:   CSR targets of incoming links
+    """
+
+    def __init__(self, page_ids, titles, out_offsets, out_targets,
+                 in_offsets, in_targets):
+        self.page_ids = page_ids
+        self.titles = titles
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+
+        self._indexes = None
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({1}, {2})'.format(
+            self, len(self), self.link_count)
+
+    def __len__(self):
+        return len(self.page_ids)
+
+    @property
+    def link_count(self):
+        return len(self.out_targets)
+
+    def index(self, title):
+        """Get dense index of article with given title or None"""
+        if self._indexes is None:
+            self._indexes = dict((t, i) for i, t in enumerate(self.titles))
+        return self._indexes.get(title)
+
+    def successors(self, index):
+        """Indexes of articles linked from article with given index"""
+        return self.out_targets[self.out_offsets[index]:
+                                self.out_offsets[index + 1]]
+
+    def predecessors(self, index):
+        """Indexes of articles linking to article with given index"""
+        return self.in_targets[self.in_offsets[index]:
+                               self.in_offsets[index + 1]]
+
+    # ---------------------
+    # Building and storage
+
+    @classmethod
+    def build(cls, language, batch_size=10000):
+        """Build the link graph of given language.
+
+        Articles are read once and links are read with one pagelinks/page
+        join per batch of source articles.
+
+        :param language:    Language code
+        :type language:     string
+
+        :param batch_size:  Number of source articles whose links are read
+                            with a single query.
+        :type batch_size:   int
+        """
+        lang_db = mwdb.databases.get_database(language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0}'.format(
+                language))
+            return None
+
+        session = lang_db.session
+        pages = lang_db.get_table('page')
+        pagelinks = lang_db.get_table('pagelinks')
+
+        _log.debug('{0}: Read articles'.format(language))
+        page_ids = _int32_array()
+        titles = []
+        for page_id, title in mwdb.Wikipedia(language).iter_article_rows(
+            ('page_id', 'page_title'), batch_size):
+            page_ids.append(page_id)
+            titles.append(title)
+
+        indexes = dict((page_id, i) for i, page_id in enumerate(page_ids))
+
+        _log.debug('{0}: Read links of {1} articles'.format(
+            language, len(page_ids)))
+        sources = _int32_array()
+        targets = _int32_array()
+        for start in range(0, len(page_ids), batch_size):
+            first = page_ids[start]
+            last = page_ids[min(start + batch_size, len(page_ids)) - 1]
+
+            for source_id, target_id in session.execute(select(
+                [pagelinks.c.pl_from, pages.c.page_id],
+                and_(pagelinks.c.pl_namespace == 0,
+                     pagelinks.c.pl_from >= first,
+                     pagelinks.c.pl_from <= last,
+                     pages.c.page_namespace == 0,
+                     pages.c.page_title == pagelinks.c.pl_title))):
+                source = indexes.get(source_id)
+                if source is not None:
+                    sources.append(source)
+                    targets.append(indexes[target_id])
+
+        del indexes
+
+        if len(sources) >= 2 ** 31:
+            raise ValueError('Too many links for 32 bit offsets: {0}'.format(
+                len(sources)))
+
+        _log.debug('{0}: Build CSR arrays for {1} links'.format(
+            language, len(sources)))
+        out_offsets, out_targets = _csr(len(page_ids), sources, targets)
+        in_offsets, in_targets = _csr(len(page_ids), targets, sources)
+
+        return cls(page_ids, titles, out_offsets, out_targets,
+                   in_offsets, in_targets)
+
+    @staticmethod
+    def filename(language):
+        """Name of the graph file for the current database of a language.
+
+        The name contains the database name, which contains the dump date, so
+        that graphs of older dumps are never loaded for a newer one.
+        """
+        lang_db = mwdb.databases.get_database(language)
+        return '{0}.linkgraph'.format(lang_db.name)
+
+    def save(self, path):
+        """Save graph to given path.
+
+        The arrays are written as little endian 32 bit integers to path, the
+        titles as UTF-8 lines to path + '.titles'. Both files are written to
+        temporary files first and renamed, the titles before the arrays, so
+        an interrupted save never leaves a truncated graph behind.
+        """
+        _log.debug('Save {0!r} to {1}'.format(self, path))
+
+        directory = os.path.dirname(os.path.abspath(path))
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with io.open(fd, 'w', encoding='utf8') as fp:
+                for title in self.titles:
+                    fp.write(title + '\n')
+            os.rename(tmp_path, path + '.titles')
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(_header.pack(_magic, len(self), self.link_count))
+                for values in (self.page_ids, self.out_offsets,
+                               self.out_targets, self.in_offsets,
+                               self.in_targets):
+                    if numpy is not None:
+                        numpy.asarray(values, dtype='<i4').tofile(fp)
+                        continue
+
+                    values = _int32_array(values)
+                    if sys.byteorder == 'big':
+                        values.byteswap()
+                    values.tofile(fp)
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Load graph from given path.
+
+        The arrays are memory mapped if NumPy is available, so loading takes
+        only as long as reading the titles.
+
+        :raises ValueError: If the file is not a link graph or its size or
+                            number of titles does not match its header
+        """
+        _log.debug('Load link graph from {0}'.format(path))
+
+        with open(path, 'rb') as fp:
+            header = fp.read(_header.size)
+
+            if len(header) != _header.size:
+                raise ValueError('Not a link graph file: {0}'.format(path))
+
+            magic, size, links = _header.unpack(header)
+
+            if magic != _magic:
+                raise ValueError('Not a link graph file: {0}'.format(path))
+
+            lengths = (size, size + 1, links, size + 1, links)
+            expected = _header.size + 4 * sum(lengths)
+
+            if os.fstat(fp.fileno()).st_size != expected:
+                raise ValueError('Truncated link graph file: {0}'.format(path))
+            arrays = []
+            offset = _header.size
+
+            for length in lengths:
+                if numpy is not None:
+                    arrays.append(numpy.memmap(path, dtype='<i4', mode='r',
+                                               offset=offset,
+                                               shape=(length, )))
+                else:
+                    values = _int32_array()
+                    values.fromfile(fp, length)
+                    if sys.byteorder == 'big':
+                        values.byteswap()
+                    arrays.append(values)
+                offset += 4 * length
+
+        with io.open(path + '.titles', encoding='utf8') as fp:
+            titles = [line.rstrip('\n') for line in fp]
+
+        if len(titles) != size:
+            raise ValueError('Truncated link graph titles: {0}.titles'.format(
+                path))
+
+        return cls(arrays[0], titles, *arrays[1:])
+
+    @classmethod
+    def for_language(cls, language, directory, batch_size=10000):
+        """Load the link graph of a language from directory or build it.
+
+        :param language:    Language code
+        :type language:     string
+
+        :param directory:   Directory for graph files
+        :type directory:    string
+        """
+        path = os.path.join(directory, cls.filename(language))
+
+        if os.path.exists(path):
+            return cls.load(path)
+
+        graph = cls.build(language, batch_size)
+
+        if graph is not None:
+            graph.save(path)
+
+        return graph
@@ -20,18 +20,37 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import itertools
 import logging
+import multiprocessing
+import multiprocessing.pool
+import time
 
 import mwdb
 
+import sqlalchemy.exc as sa_exc
+
+from sqlalchemy import func
 from sqlalchemy.orm import object_mapper
 from sqlalchemy.ext.associationproxy import association_proxy
 
+from . import categorytree
+from . import text
 from . import wikipedia
 
 _log = logging.getLogger(__name__)
 
+
+def _endwith_filter(cls, string):
+    """Filter for page titles that end with given string.
+
+    On PostgreSQL the filter is written as a prefix search on the reversed
+    title, which is served by the reverse(page_title) index.
+    """
+    if mwdb.databases.get_database(cls.language).vendor == 'postgresql':
+        return func.reverse(cls.title).like('{0}%%'.format(string[::-1]))
+    return cls.title.like('%%{0}'.format(string))
+
+
 class PageLink(object):
     """A PageLink"""
 
@@ -49,6 +68,23 @@ class PageLink(object):
         return object_mapper(self).language
 
 
+class Redirect(object):
+    """A Redirect"""
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({0.title!r})'.format(self)
+
+    def __str__(self):
+        return unicode(self).encode('utf8')
+
+    def __unicode__(self):
+        return '{0.__class__.__name__}({0.title})'.format(self)
+
+    @property
+    def language(self):
+        return object_mapper(self).language
+
+
 class CategoryLink(object):
     """A CategoryLink"""
 
@@ -91,12 +127,170 @@ class Page(object):
     def __unicode__(self):
         return '{0.__class__.__name__}({0.title})'.format(self)
 
-    def iter_translations(self):
+    def iter_translations(self, workers=None, timeout=None):
         raise NotImplementedError('Implement this method in a subclass')
 
+    def _iter_translations(self, method_name, workers=None, timeout=None):
+        """Translation generator.
+
+        Language links are grouped by language and every language is queried
+        only once with the batched lookup method of mwdb.Wikipedia.
+        Translations are returned ordered by language and, within a language,
+        in the order of the language links.
+
+        :param method_name: Name of the batched lookup method of
+                            mwdb.Wikipedia (get_articles, get_categories)
+        :type method_name:  string
+
+        :param workers:     Number of languages that will be queried
+                            concurrently. Languages are queried one after
+                            another if this is None.
+        :type workers:      int
+
+        :param timeout:     Seconds to wait for the results of the languages,
+                            counted from the start of the lookups. Languages
+                            that take longer are skipped.
+        :type timeout:      float
+        """
+        titles = {}
+        for ll in self.language_links:
+            lang = ll.lang.replace('-', '_')
+            if lang in mwdb.databases.languages:
+                titles.setdefault(lang, []).append(ll.title)
+
+        languages = sorted(titles)
+
+        def lookup(lang):
+            return getattr(mwdb.Wikipedia(lang), method_name)(titles[lang])
+
+        if workers is None or len(languages) < 2:
+            if timeout is None:
+                results = ((lang, lookup(lang)) for lang in languages)
+            else:
+                results = self._iter_serial_lookups(lookup, languages,
+                                                    timeout)
+        else:
+            results = self._iter_concurrent_lookups(
+                lookup, languages, workers, timeout)
+
+        for lang, pages in results:
+            if pages is None:
+                continue
+
+            for title in titles[lang]:
+                page = pages.get(title)
+                if page:
+                    yield page
+
+    def _iter_serial_lookups(self, lookup, languages, timeout):
+        """Run lookup for one language after another until a deadline.
+
+        Every lookup runs on a private session. Languages are skipped once
+        the deadline has passed. On PostgreSQL the server cancels a lookup
+        that runs past the deadline (statement_timeout), so a slow database
+        cannot block the caller. The pages found are merged into the session
+        of the caller.
+        """
+        deadline = time.time() + timeout
+
+        for lang in languages:
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                _log.warning('{0}: Translation lookup timed out'.format(lang))
+                continue
+
+            lang_db = mwdb.databases.get_database(lang)
+
+            with lang_db.checkout_session() as session:
+                if lang_db.vendor == 'postgresql':
+                    # SET LOCAL ends with the transaction of the session
+                    session.execute('SET LOCAL statement_timeout = {0}'.format(
+                        int(remaining * 1000) + 1))
+
+                try:
+                    pages = lookup(lang)
+                except sa_exc.OperationalError as op_err:
+                    if time.time() < deadline:
+                        raise
+                    _log.warning('{0}: Translation lookup timed out'.format(
+                        lang))
+                    continue
+
+            if pages is not None:
+                yield lang, self._merge_pages(lang, pages)
+
+    def _merge_pages(self, lang, pages):
+        """Merge title -> page mapping into the session of language"""
+        session = mwdb.databases.get_database(lang).session
+        return dict((title, session.merge(page, load=False)
+                     if page is not None else None)
+                    for title, page in pages.iteritems())
+
+    def _iter_concurrent_lookups(self, lookup, languages, workers, timeout):
+        """Run lookup for all languages in a bounded thread pool.
+
+        Every lookup runs on a private session that is closed in the worker,
+        so workers left behind by a timeout never share a session with the
+        caller. The pages found are merged into the session of the caller.
+        """
+        def private_lookup(lang):
+            with mwdb.databases.get_database(lang).checkout_session():
+                return lookup(lang)
+
+        pool = multiprocessing.pool.ThreadPool(min(workers, len(languages)))
+
+        try:
+            deadline = None
+            if timeout is not None:
+                deadline = time.time() + timeout
+
+            pending = [(lang, pool.apply_async(private_lookup, (lang, )))
+                       for lang in languages]
+
+            for lang, async_result in pending:
+                wait = None
+                if deadline is not None:
+                    wait = max(deadline - time.time(), 0)
+
+                try:
+                    pages = async_result.get(wait)
+                except multiprocessing.TimeoutError as to_err:
+                    _log.warning('{0}: Translation lookup timed out'.format(
+                        lang))
+                    continue
+
+                if pages is None:
+                    continue
+
+                yield lang, self._merge_pages(lang, pages)
+        finally:
+            # threads still waiting for a slow database are left behind,
+            # they close their sessions when they are done
+            pool.close()
+
     @property
     def raw_text(self):
-        return self.latest_text.text
+        """Latest text of this page.
+
+        The text cache of the database is consulted before the text is
+        loaded.
+        """
+        return text.cached_text(mwdb.databases.get_database(self.language),
+                                self.latest_id,
+                                lambda: text.decode_text(
+                                    self.latest_text.data,
+                                    self.latest_text.flags,
+                                    self.latest_id))
+
+    def iter_raw_text(self, slice_size=None):
+        """Latest text of this page in slices of given number of characters.
+
+        See text.iter_text_slices.
+        """
+        return text.iter_text_slices(
+            mwdb.databases.get_database(self.language), self.latest_id,
+            slice_size)
 
     def iter_categories_startwith(self, string, batch_size=42):
         """All categories of this Page whose titles start with the given
@@ -126,7 +320,7 @@ class Page(object):
         """
         cls = mwdb.databases.get_database(self.language).get_class('Category')
         return self._category_query.filter(
-            cls.title.like('%%{0}'.format(string))).yield_per(batch_size)
+            _endwith_filter(cls, string)).yield_per(batch_size)
 
     def iter_categories_contain(self, string, batch_size=42):
         """All categories of this Page whose titles contain the given
@@ -153,18 +347,43 @@ class Article(Page):
     def iter_linked_article_titles(self):
         return (t.title for t in self.article_links)
 
-    def iter_linked_articles(self):
-        return itertools.ifilter(lambda x:x, self._linked_articles)
+    def iter_linked_articles(self, batch_size=500):
+        """Articles linked from this article.
 
-    def iter_linked_from_articles(self):
-        return itertools.ifilter(lambda x:x, self._linked_from_articles)
+        The links are resolved with a single pagelinks/page join. Broken
+        links are skipped.
 
-    def iter_translations(self):
-        return (article for article in
-                (mwdb.Wikipedia(ll.lang.replace('-', '_')).get_article(ll.title)
-                 for ll in self.language_links
-                 if ll.lang.replace('-', '_') in mwdb.databases.languages)
-                if article)
+        :param batch_size:  Number of articles that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+        """
+        query, key = wikipedia.linked_articles_query(
+            mwdb.databases.get_database(self.language))
+        return (article for article, source_id in
+                query.filter(key == self.id).yield_per(batch_size))
+
+    def iter_linked_from_articles(self, batch_size=500):
+        """Articles linking to this article.
+
+        See iter_linked_articles.
+        """
+        query, key = wikipedia.linked_articles_query(
+            mwdb.databases.get_database(self.language), incoming=True)
+        return (article for article, title in
+                query.filter(key == self.title).yield_per(batch_size))
+
+    def iter_translations(self, workers=None, timeout=None):
+        """Corresponding articles in other languages.
+
+        :param workers:     Number of languages that will be queried
+                            concurrently.
+        :type workers:      int
+
+        :param timeout:     Seconds to wait for the languages, counted from
+                            the start of the lookups.
+        :type timeout:      float
+        """
+        return self._iter_translations('get_articles', workers, timeout)
 
 
 class Template(Page):
@@ -174,12 +393,80 @@ class Template(Page):
 class Category(Page):
     """A Category"""
 
-    def iter_translations(self):
-        return (cat for cat in
-                (mwdb.Wikipedia(ll.lang.replace('-', '_')).get_category(ll.title)
-                 for ll in self.language_links
-                 if ll.lang.replace('-', '_') in mwdb.databases.languages)
-                if cat)
+    def iter_translations(self, workers=None, timeout=None):
+        """Corresponding categories in other languages.
+
+        :param workers:     Number of languages that will be queried
+                            concurrently.
+        :type workers:      int
+
+        :param timeout:     Seconds to wait for the languages, counted from
+                            the start of the lookups.
+        :type timeout:      float
+        """
+        return self._iter_translations('get_categories', workers, timeout)
+
+    def iter_descendants(self, max_depth=None, with_depth=False):
+        """All subcategories of this category down to given depth.
+
+        Categories are returned ordered by their distance to this category.
+        Categories that can be reached on several paths are returned only
+        once.
+
+        :param max_depth:   Maximum distance to this category. Defaults to
+                            categorytree.max_category_depth.
+        :type max_depth:    int
+
+        :param with_depth:  Return (category, depth) tuples
+        :type with_depth:   bool
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+        return self._iter_tree(
+            lang_db, categorytree.descendants(lang_db, self, max_depth),
+            with_depth)
+
+    def iter_ancestors(self, max_depth=None, with_depth=False):
+        """All supercategories of this category up to given depth.
+
+        Categories are returned ordered by their distance to this category.
+        Categories that can be reached on several paths are returned only
+        once.
+
+        :param max_depth:   Maximum distance to this category. Defaults to
+                            categorytree.max_category_depth.
+        :type max_depth:    int
+
+        :param with_depth:  Return (category, depth) tuples
+        :type with_depth:   bool
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+        return self._iter_tree(
+            lang_db, categorytree.ancestors(lang_db, self, max_depth),
+            with_depth)
+
+    def iter_member_pages_recursive(self, max_depth=None):
+        """All articles in this category and its subcategories.
+
+        :param max_depth:   Maximum depth of the subcategories whose articles
+                            are returned. Defaults to
+                            categorytree.max_category_depth.
+        :type max_depth:    int
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+        return categorytree.iter_pages(
+            lang_db, lang_db.get_class('Article'),
+            categorytree.member_page_ids(lang_db, self, max_depth))
+
+    def _iter_tree(self, lang_db, found, with_depth):
+        depths = dict(found)
+        categories = categorytree.iter_pages(
+            lang_db, lang_db.get_class('Category'),
+            [page_id for page_id, depth in found])
+
+        if not with_depth:
+            return categories
+
+        return ((cat, depths[cat.id]) for cat in categories)
 
     def iter_subcategories_startwith(self, string, batch_size=42):
         """All subcategories whose titles start with the given string.
@@ -207,7 +494,7 @@ class Category(Page):
         """
         cls = mwdb.databases.get_database(self.language).get_class('Category')
         return self._subcategory_query.filter(
-            cls.title.like('%%{0}'.format(string))).yield_per(batch_size)
+            _endwith_filter(cls, string)).yield_per(batch_size)
 
     def iter_subcategories_contain(self, string, batch_size=42):
         """All subcategories whose titles contain the given string.
@@ -251,7 +538,7 @@ class Category(Page):
         """
         cls = mwdb.databases.get_database(self.language).get_class('Article')
         return self._member_page_query.filter(
-            cls.title.like('%%{0}'.format(string))).yield_per(batch_size)
+            _endwith_filter(cls, string)).yield_per(batch_size)
 
     def iter_member_page_contain(self, string, batch_size=42):
         """All pages that belong to this category whose titles contain the
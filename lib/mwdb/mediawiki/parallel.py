@@ -0,0 +1,240 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""Parallel processing of page id ranges in worker processes.
+
+Every worker process opens its own connection to the language database and
+processes whole page id ranges, so no database state is shared between
+processes.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import functools
+import logging
+import multiprocessing
+
+import mwdb
+
+from sqlalchemy import and_, func, select
+
+from .. import exceptions
+
+_log = logging.getLogger(__name__)
+
+# settings of the language database that are handed to the workers
+_database_settings = ('pool_size', 'pool_recycle', 'title_cache_size',
+                      'metadata_cache_dir', 'defer_text', 'text_cache')
+
+# registries inherited from the parent process. They are kept alive but
+# never used, so that their connections are not closed from the worker.
+_inherited = []
+
+# marker for ranges without any pages
+_empty = object()
+
+
+def page_id_ranges(lang_db, namespace, parts):
+    """Split the page ids of a namespace into ranges of similar size.
+
+    The id range between the smallest and the largest page id is split
+    evenly and every boundary is moved to the next page id of the namespace
+    with a single index lookup, so the table is never scanned.
+
+    :param lang_db:     Database of the language
+    :type lang_db:      mwdb.orm.database.Database
+
+    :param namespace:   Namespace of the pages
+    :type namespace:    int
+
+    :param parts:       Wanted number of ranges
+    :type parts:        int
+
+    :return:            List of (min_id, max_id) tuples. min_id is exclusive,
+                        max_id inclusive.
+    :rtype:             list
+    """
+    session = lang_db.session
+    pages = lang_db.get_table('page')
+    in_namespace = pages.c.page_namespace == namespace
+
+    min_id, max_id = session.execute(
+        select([func.min(pages.c.page_id), func.max(pages.c.page_id)],
+               in_namespace)).fetchone()
+
+    if min_id is None:
+        return []
+
+    # page ids are assumed to be spread evenly over the pages
+    boundaries = [min_id - 1]
+    for part in range(1, parts):
+        row = session.execute(select(
+            [pages.c.page_id],
+            and_(in_namespace, pages.c.page_id >=
+                 min_id + (max_id - min_id + 1) * part // parts),
+            order_by=[pages.c.page_id], limit=1)).fetchone()
+
+        if row is not None and boundaries[-1] < row[0] < max_id:
+            boundaries.append(row[0])
+    boundaries.append(max_id)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _init_worker(db_cls, db_args, names, settings):
+    """Initialise a worker process with its own language database.
+
+    The databases and the engine registry inherited from the parent are
+    replaced, but kept referenced, so the pooled connections of the parent
+    are neither used nor closed by the worker.
+
+    :param names:       Database name regex and date format of the parent
+    :type names:        tuple
+
+    :param settings:    Settings of the parent language database
+    :type settings:     dict
+    """
+    database = mwdb.orm.database
+    _inherited.append((mwdb.databases, database.engines))
+
+    database.engines = database.EngineRegistry()
+    mwdb.databases = database.Databases(*names)
+
+    lang_db = db_cls(*db_args)
+    for name, value in settings.items():
+        setattr(mwdb.databases, name, value)
+        setattr(lang_db, name, value)
+    mwdb.databases.add_database(lang_db)
+
+
+def _map_range(task):
+    """Apply a function to all rows of a page id range.
+
+    :return:    (index, has result, partial result, error message) tuple
+    """
+    (index, language, namespace, min_id, max_id, map_func, reduce_func,
+     columns, batch_size, retries) = task
+
+    for attempt in range(retries + 1):
+        try:
+            values = (map_func(row) for row in
+                      mwdb.Wikipedia(language)._iter_rows(
+                          namespace, columns, batch_size, False,
+                          min_id, max_id))
+
+            if reduce_func is None:
+                return index, True, list(values), None
+
+            partial = functools.reduce(_skip_empty(reduce_func), values,
+                                       _empty)
+
+            if partial is _empty:
+                return index, False, None, None
+
+            return index, True, partial, None
+
+        except Exception as err:
+            _log.warning('{0}: Range ({1}, {2}] failed ({3}/{4}): {5}'.format(
+                language, min_id, max_id, attempt + 1, retries + 1, err))
+
+            # start the next attempt with a fresh transaction
+            lang_db = mwdb.databases.get_database(language)
+            if lang_db is not None and lang_db.engine is not None:
+                lang_db.session.rollback()
+
+            message = '{0}: {1}'.format(err.__class__.__name__, err)
+
+    return index, False, None, message
+
+
+def _skip_empty(reduce_func):
+    """Wrap reduce function so that it ignores the empty marker."""
+    def reduce_values(left, right):
+        if left is _empty:
+            return right
+        if right is _empty:
+            return left
+        return reduce_func(left, right)
+    return reduce_values
+
+
+def map_pages(lang_db, namespace, map_func, columns, workers=None,
+              reduce_func=None, initial=_empty, batch_size=1000, retries=2,
+              ranges_per_worker=4):
+    """Map a function over all page rows of a namespace in worker processes.
+
+    See mwdb.Wikipedia.map_articles for a description of the parameters.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    ranges = page_id_ranges(lang_db, namespace, workers * ranges_per_worker)
+    _log.debug('{0.language}: Map over {1} ranges with {2} workers'.format(
+        lang_db, len(ranges), workers))
+
+    tasks = [(index, lang_db.language, namespace, min_id, max_id, map_func,
+              reduce_func, columns, batch_size, retries)
+             for index, (min_id, max_id) in enumerate(ranges)]
+
+    db_args = (lang_db.driver, lang_db.user, lang_db.password, lang_db.host,
+               lang_db.name, lang_db.language)
+    names = (mwdb.databases.db_name_regex, mwdb.databases.date_format)
+    settings = dict((name, getattr(lang_db, name))
+                    for name in _database_settings)
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (lang_db.__class__, db_args, names, settings))
+
+    partials = {}
+    failed = []
+    result = initial
+
+    try:
+        for index, has_result, partial, message in pool.imap_unordered(
+            _map_range, tasks):
+            if message is not None:
+                min_id, max_id = ranges[index]
+                _log.error('{0.language}: Range ({1}, {2}] failed: {3}'.format(
+                    lang_db, min_id, max_id, message))
+                failed.append((min_id, max_id, message))
+            elif reduce_func is None:
+                partials[index] = partial
+            elif has_result:
+                # partial results are combined as soon as they arrive
+                result = _skip_empty(reduce_func)(result, partial)
+
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    if reduce_func is None:
+        result = [value for index in sorted(partials)
+                  for value in partials[index]]
+    elif result is _empty:
+        result = None
+
+    if failed:
+        raise exceptions.MapError(
+            '{0.language}: {1} of {2} ranges failed'.format(
+                lang_db, len(failed), len(ranges)), failed, result)
+
+    return result
@@ -20,6 +20,272 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import base64
+import binascii
+import codecs
+import zlib
+
+import mwdb
+
+from sqlalchemy import func, select
+
+from .. import exceptions
+
+# number of characters read with a single query when texts are streamed
+text_slice_size = 1 << 20
+
+# encoding of texts stored without the utf-8 flag
+legacy_encoding = 'latin-1'
+
+# flags of texts that are stored in a form mwdb cannot read
+_unsupported_flags = frozenset(['object', 'external'])
+
+# errors of corrupt stored data, base64 of Python 2 raises TypeError
+_decode_errors = (zlib.error, binascii.Error, TypeError, UnicodeDecodeError)
+
+
+def _flag_set(flags):
+    """Set of the comma separated flags in old_flags"""
+    return frozenset(flag.strip() for flag in (flags or '').split(',')
+                     if flag.strip())
+
+
+def _as_bytes(data):
+    """Stored data as byte string.
+
+    Compressed data read from a text column arrives as unicode with one
+    character per byte.
+    """
+    if isinstance(data, unicode):
+        return data.encode('latin-1')
+    return data
+
+
+def _check_flags(flags, text_id=None):
+    unsupported = flags & _unsupported_flags
+    if unsupported:
+        raise exceptions.TextError(
+            'Text {0}: Unsupported text flags: {1}'.format(
+                text_id, ','.join(sorted(unsupported))),
+            text_id, ','.join(sorted(flags)))
+
+
+def _decode_error(err, flags, text_id):
+    """TextError for an error raised while decoding stored data"""
+    flags = ','.join(sorted(flags))
+    return exceptions.TextError('Text {0} ({1}): Cannot decode: {2}'.format(
+        text_id, flags, err), text_id, flags)
+
+
+def decode_text(data, flags, text_id=None):
+    """Decode a stored text according to its MediaWiki flags.
+
+    gzip texts are raw deflate streams (without zlib or gzip header), texts
+    without the utf-8 flag use legacy_encoding. The base64 flag is set by
+    encode_text for compressed texts in text columns.
+
+    :param data:    Value of old_text
+    :type data:     unicode or bytes
+
+    :param flags:   Value of old_flags
+    :type flags:    string
+
+    :param text_id: Value of old_id, which is reported in errors
+    :type text_id:  int
+
+    :rtype:         unicode
+
+    :raises TextError:  If the flags are not supported or the data is
+                        corrupt
+    """
+    flags = _flag_set(flags)
+    _check_flags(flags, text_id)
+
+    if isinstance(data, unicode) and 'gzip' not in flags:
+        return data
+
+    try:
+        data = _as_bytes(data)
+
+        if 'base64' in flags:
+            data = base64.b64decode(data)
+
+        if 'gzip' in flags:
+            data = zlib.decompress(data, -15)
+
+        return data.decode('utf8' if 'utf-8' in flags else legacy_encoding)
+    except _decode_errors as err:
+        raise _decode_error(err, flags, text_id)
+
+
+def encode_text(text, compress=False):
+    """Encode a text for storage in the text table.
+
+    Compressed texts are stored as base64 encoded raw deflate streams, so
+    they fit into the text columns of all supported databases.
+
+    :param text:        Text to store
+    :type text:         unicode
+
+    :param compress:    Compress the text
+    :type compress:     bool
+
+    :return:            (old_text, old_flags) tuple
+    """
+    if not compress:
+        return text, 'utf-8'
+
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  -15)
+    data = compressor.compress(text.encode('utf8')) + compressor.flush()
+
+    return base64.b64encode(data).decode('ascii'), 'utf-8,gzip,base64'
+
+
+def decode_slices(slices, flags, text_id=None):
+    """Decode a text that is read in slices of stored data.
+
+    Compressed texts are decompressed incrementally, so only a single slice
+    is held in memory at a time.
+
+    :param slices:  Slices of old_text
+    :type slices:   iterable
+
+    :param flags:   Value of old_flags
+    :type flags:    string
+
+    :param text_id: Value of old_id, which is reported in errors
+    :type text_id:  int
+
+    :raises TextError:  If the flags are not supported or the data is
+                        corrupt
+    """
+    flags = _flag_set(flags)
+    _check_flags(flags, text_id)
+
+    try:
+        for decoded in _decode_slices(slices, flags):
+            yield decoded
+    except _decode_errors as err:
+        raise _decode_error(err, flags, text_id)
+
+
+def _decode_slices(slices, flags):
+    """Generator of decoded slices, see decode_slices"""
+    decompressor = None
+    if 'gzip' in flags:
+        decompressor = zlib.decompressobj(-15)
+
+    decoder = codecs.getincrementaldecoder(
+        'utf8' if 'utf-8' in flags else legacy_encoding)()
+    rest = b''
+
+    for data in slices:
+        if isinstance(data, unicode) and decompressor is None:
+            yield data
+            continue
+
+        data = _as_bytes(data)
+
+        if 'base64' in flags:
+            # base64 can only be decoded in groups of four characters
+            data = rest + data
+            cut = len(data) - len(data) % 4
+            data, rest = base64.b64decode(data[:cut]), data[cut:]
+
+        if decompressor is not None:
+            data = decompressor.decompress(data)
+
+        decoded = decoder.decode(data)
+        if decoded:
+            yield decoded
+
+    tail = b''
+    if decompressor is not None:
+        tail = decompressor.flush()
+
+    decoded = decoder.decode(tail, True)
+    if decoded:
+        yield decoded
+
+
+def iter_text_slices(lang_db, text_id, slice_size=None, flags=None):
+    """Read a text in slices with substring queries.
+
+    Only a single slice of the text is held in memory at a time. Compressed
+    texts are decompressed on the fly (see decode_slices).
+
+    :param lang_db:     Database of the language
+    :type lang_db:      mwdb.orm.database.Database
+
+    :param text_id:     Id of the text (old_id)
+    :type text_id:      int
+
+    :param slice_size:  Number of characters read with a single query.
+                        Defaults to text_slice_size.
+    :type slice_size:   int
+
+    :param flags:       Value of old_flags if known
+    :type flags:        string
+    """
+    if slice_size is None:
+        slice_size = text_slice_size
+
+    session = lang_db.session
+    texts = lang_db.get_table('text')
+
+    if flags is None:
+        flags = session.execute(select([texts.c.old_flags],
+                                       texts.c.old_id == text_id)).scalar()
+
+    def read_slices():
+        start = 1
+
+        while True:
+            text_slice = session.execute(select(
+                [func.substr(texts.c.old_text, start, slice_size)],
+                texts.c.old_id == text_id)).scalar()
+
+            if not text_slice:
+                return
+
+            yield text_slice
+
+            if len(text_slice) < slice_size:
+                return
+
+            start += slice_size
+
+    return decode_slices(read_slices(), flags, text_id)
+
+
+def cached_text(lang_db, text_id, load):
+    """Get a text through the text cache of a language database.
+
+    :param lang_db:     Database of the language
+    :type lang_db:      mwdb.orm.database.Database
+
+    :param text_id:     Id of the text (old_id)
+    :type text_id:      int
+
+    :param load:        Function that loads the decoded text on a miss
+    :type load:         callable
+    """
+    text_cache = lang_db.text_cache
+
+    if text_cache is None or text_id is None:
+        return load()
+
+    text = text_cache.get(lang_db.name, text_id)
+
+    if text is None:
+        text = load()
+        if text is not None:
+            text_cache.set(lang_db.name, text_id, text)
+
+    return text
+
+
 class PageText(object):
     """A Text."""
 
@@ -32,6 +298,18 @@ class PageText(object):
     def __unicode__(self):
         return '{0.__class__.__name__}({0.title})'.format(self)
 
+    @property
+    def text(self):
+        """Decoded text (see decode_text).
+
+        The text is read through the text cache of the database if there is
+        one. Map texts with defer_text to avoid loading them on cache hits.
+        """
+        return cached_text(mwdb.databases.get_database(self.language),
+                           self.id,
+                           lambda: decode_text(self.data, self.flags,
+                                               self.id))
+
     @property
     def timestamp(self):
         return self.revision.timestamp
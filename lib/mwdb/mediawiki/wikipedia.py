@@ -20,15 +20,263 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import base64
+import itertools
 import logging
+import multiprocessing.pool
 
 import sqlalchemy.orm.exc as orm_exc
 import mwdb
 
+from sqlalchemy import and_, select
+
+try:
+    from sqlalchemy.orm import subqueryload, subqueryload_all
+except ImportError as imp_err:
+    # SQLAlchemy < 0.6 can only load relations eagerly with joins
+    from sqlalchemy.orm import eagerload as subqueryload
+    from sqlalchemy.orm import eagerload_all as subqueryload_all
+
 from . import markup
+from . import parallel
+from . import text
 
 _log = logging.getLogger(__name__)
 
+# number of titles that are looked up with a single IN (...) query
+title_chunk_size = 1000
+
+# marker for titles that are not in the title cache
+_missing = object()
+
+# maximum length of redirect chains that will be followed
+max_redirect_hops = 5
+
+# loading profiles: relations that are loaded together with every batch of
+# pages. Names that are not listed here are used as relation names.
+load_profiles = {
+    'categories': ('categories', ),
+    'language_links': ('language_links', ),
+    'text': ('latest_text', ),
+    'links': ('article_links', ),
+    'linked_articles': ('article_links.goal', ),
+    'translations': ('language_links', ),
+}
+
+
+def load_options(load):
+    """Get query options for given loading profiles.
+
+    :param load:    Names of loading profiles or relations. Dotted relation
+                    paths load nested relations.
+    :type load:     sequence
+    """
+    options = []
+
+    for name in load:
+        for path in load_profiles.get(name, (name, )):
+            if '.' in path:
+                options.append(subqueryload_all(path))
+            else:
+                options.append(subqueryload(path))
+
+    return options
+
+
+# page columns returned by the row iterators by default
+default_row_columns = ('page_id', 'page_title', 'page_is_redirect')
+
+# record classes by column names
+_record_classes = {}
+
+
+class PageRecord(object):
+    """Light weight page record without ORM instrumentation.
+
+    Subclasses are created by record_class and have one slot per selected
+    column.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '{0}({1})'.format(
+            self.__class__.__name__,
+            ', '.join(repr(getattr(self, name)) for name in self._fields))
+
+
+def record_class(columns):
+    """Get the record class for given page columns.
+
+    :param columns: Names of the columns
+    :type columns:  sequence
+    """
+    columns = tuple(str(c) for c in columns)
+
+    try:
+        return _record_classes[columns]
+    except KeyError:
+        cls = type(str('PageRecord'), (PageRecord, ),
+                   {str('__slots__'): columns, str('_fields'): columns})
+        _record_classes[columns] = cls
+        return cls
+
+
+def linked_articles_query(lang_db, incoming=False):
+    """Query for articles and their link keys in a single pagelinks join.
+
+    For outgoing links the query returns (linked article, pl_from) rows,
+    for incoming links (linking article, pl_title) rows. Broken links have
+    no article and are not returned.
+
+    :param lang_db:     Database of the language
+    :type lang_db:      mwdb.orm.database.Database
+
+    :param incoming:    Query articles linking to the keys instead of
+                        articles linked from them
+    :type incoming:     bool
+
+    :return:            (query, key column) tuple. Filter the key column to
+                        select the link sources or targets.
+    """
+    session = lang_db.session
+    cls = lang_db.get_class('Article')
+    pagelinks = lang_db.get_table('pagelinks')
+
+    if incoming:
+        return (session.query(cls, pagelinks.c.pl_title).filter(and_(
+                    pagelinks.c.pl_namespace == 0,
+                    pagelinks.c.pl_from == cls.id)),
+                pagelinks.c.pl_title)
+
+    return (session.query(cls, pagelinks.c.pl_from).filter(and_(
+                pagelinks.c.pl_namespace == 0,
+                pagelinks.c.pl_title == cls.title)),
+            pagelinks.c.pl_from)
+
+
+def _decode_row(row):
+    """Decode a (page_id, old_id, old_text, old_flags) row"""
+    page_id, text_id, data, flags = row
+    return page_id, text.decode_text(data, flags, text_id)
+
+
+class KeysetScan(object):
+    """Resumable scan over all pages of a class ordered by page id.
+
+    Pages are fetched in batches with queries of the form
+    ``page_id > last_seen ORDER BY page_id LIMIT batch_size``, so the scan
+    never buffers more than a single batch.
+
+    The checkpoint attribute is an opaque token that marks all pages
+    returned before the current one as done. A new scan started with that
+    token continues with the current page.
+
+    A streaming scan reads through its own read-only session and removes
+    every batch from it before the next one is fetched, so memory stays flat
+    however long the scan runs. Pages of a consumed batch are detached, so
+    their relations have to be used before moving on to the next batch or
+    loaded with the options of the scan.
+    """
+
+    def __init__(self, lang_db, cls, batch_size=500, checkpoint=None,
+                 options=(), streaming=False):
+        """Constructor.
+
+        :param lang_db:     Database of the scanned language
+        :type lang_db:      mwdb.orm.database.Database
+
+        :param cls:         Mapped page class (Article, Category, ...)
+        :type cls:          class
+
+        :param batch_size:  Number of pages fetched with a single query
+        :type batch_size:   int
+
+        :param checkpoint:  Token of an earlier scan to resume from
+        :type checkpoint:   string
+
+        :param options:     Query options applied to every batch
+        :type options:      sequence
+
+        :param streaming:   Use a read-only session and drop every batch
+                            from it once it is consumed
+        :type streaming:    bool
+        """
+        self._lang_db = lang_db
+        self._cls = cls
+        self._options = list(options)
+        self.batch_size = batch_size
+        self.streaming = streaming
+        self.last_id = None
+
+        if checkpoint is not None:
+            self.last_id = self._decode_checkpoint(checkpoint)
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({0._cls.__name__}, {0.last_id})'.format(
+            self)
+
+    def __iter__(self):
+        if not self.streaming:
+            for page in self._iter_batches(lambda: self._lang_db.session):
+                yield page
+            return
+
+        with self._lang_db.readonly_session() as session:
+            for page in self._iter_batches(lambda: session):
+                yield page
+
+    def _iter_batches(self, get_session):
+        cls = self._cls
+
+        while True:
+            session = get_session()
+
+            if self.streaming:
+                session.expunge_all()
+
+            query = session.query(cls).options(
+                *self._options).order_by(cls.id)
+
+            if self.last_id is not None:
+                query = query.filter(cls.id > self.last_id)
+
+            batch = query.limit(self.batch_size).all()
+
+            if not batch:
+                return
+
+            for page in batch:
+                yield page
+                self.last_id = page.id
+
+    @property
+    def checkpoint(self):
+        """Opaque token to resume this scan from"""
+        token = '{0}:{1}'.format(self._lang_db.name, self.last_id or 0)
+        return base64.urlsafe_b64encode(token.encode('utf8')).decode('ascii')
+
+    def _decode_checkpoint(self, checkpoint):
+        """Get the last page id from a checkpoint token"""
+        try:
+            token = base64.urlsafe_b64decode(
+                checkpoint.encode('ascii')).decode('utf8')
+            db_name, last_id = token.rsplit(':', 1)
+            last_id = int(last_id)
+        except (TypeError, ValueError) as err:
+            raise ValueError('Invalid checkpoint: {0}'.format(checkpoint))
+
+        if db_name != self._lang_db.name:
+            raise ValueError('Checkpoint belongs to database: {0}'.format(
+                db_name))
+
+        return last_id or None
+
 
 class Wikipedia(object):
     """Wikipedia in a single language."""
@@ -45,7 +293,7 @@ class Wikipedia(object):
     def __unicode__(self):
         return 'Wikipedia({0.language})'.format(self)
 
-    def iter_articles(self, batch_size=500):
+    def iter_articles(self, batch_size=500, load=None, streaming=False):
         """Article generator.
 
         This method returns all articles in this Wikipedia language version.
@@ -53,7 +301,23 @@ class Wikipedia(object):
         :param batch_size:  Number of articles that will be fetched
                             simultaneously from the database.
         :type batch_size:   int
+
+        :param load:        Loading profiles (see load_profiles) or names of
+                            relations that are loaded together with every
+                            batch, so that accessing them does not need a
+                            query per article.
+        :type load:         sequence
+
+        :param streaming:   Read through a read-only session that forgets
+                            every batch once it is consumed, so memory does
+                            not grow with the number of articles
+                            (see KeysetScan).
+        :type streaming:    bool
         """
+        if load or streaming:
+            return self._scan('Article', batch_size, None,
+                              load_options(load or ()), streaming)
+
         lang_db = mwdb.databases.get_database(self.language)
 
         if lang_db is None:
@@ -64,15 +328,31 @@ class Wikipedia(object):
         return lang_db.session.query(lang_db.get_class('Article')).yield_per(
             batch_size)
 
-    def iter_categories(self, batch_size=500):
+    def iter_categories(self, batch_size=500, load=None, streaming=False):
         """Category generator.
 
-        This method returns all articles in this Wikipedia language version.
+        This method returns all categories in this Wikipedia language version.
 
-        :param batch_size:  Number of articles that will be fetched
+        :param batch_size:  Number of categories that will be fetched
                             simultaneously from the database.
         :type batch_size:   int
+
+        :param load:        Loading profiles (see load_profiles) or names of
+                            relations that are loaded together with every
+                            batch, so that accessing them does not need a
+                            query per category.
+        :type load:         sequence
+
+        :param streaming:   Read through a read-only session that forgets
+                            every batch once it is consumed, so memory does
+                            not grow with the number of categories
+                            (see KeysetScan).
+        :type streaming:    bool
         """
+        if load or streaming:
+            return self._scan('Category', batch_size, None,
+                              load_options(load or ()), streaming)
+
         lang_db = mwdb.databases.get_database(self.language)
 
         if lang_db is None:
@@ -83,7 +363,245 @@ class Wikipedia(object):
         return lang_db.session.query(lang_db.get_class('Category')).yield_per(
             batch_size)
 
-    def get_article(self, title):
+    def iter_article_rows(self, columns=default_row_columns, batch_size=1000,
+                          records=False):
+        """Article row generator.
+
+        Rows are read with plain SQL statements from the page table, so no
+        ORM instances are created or tracked in the session.
+
+        :param columns:     Names of the page columns to return
+        :type columns:      sequence
+
+        :param batch_size:  Number of rows that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+
+        :param records:     Return PageRecord instances instead of tuples
+        :type records:      bool
+        """
+        return self._iter_rows(0, columns, batch_size, records)
+
+    def iter_category_rows(self, columns=default_row_columns, batch_size=1000,
+                           records=False):
+        """Category row generator.
+
+        Rows are read with plain SQL statements from the page table, so no
+        ORM instances are created or tracked in the session.
+
+        :param columns:     Names of the page columns to return
+        :type columns:      sequence
+
+        :param batch_size:  Number of rows that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+
+        :param records:     Return PageRecord instances instead of tuples
+        :type records:      bool
+        """
+        return self._iter_rows(14, columns, batch_size, records)
+
+    def _iter_rows(self, namespace, columns, batch_size, records,
+                   min_id=None, max_id=None):
+        """Generator of page rows in given namespace ordered by page id.
+
+        Rows are fetched in keyset paginated batches. min_id (exclusive) and
+        max_id (inclusive) restrict the scan to a range of page ids.
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return
+
+        session = lang_db.session
+        pages = lang_db.get_table('page')
+
+        try:
+            selected = [pages.c[name] for name in columns]
+        except KeyError as k_err:
+            raise ValueError('Unknown page column: {0}'.format(k_err))
+
+        # the page id is needed for pagination even if it was not asked for
+        width = len(selected)
+        if 'page_id' in columns:
+            key_index = list(columns).index('page_id')
+        else:
+            key_index = width
+            selected.append(pages.c.page_id)
+
+        record_cls = record_class(columns) if records else None
+        last_id = min_id
+
+        while True:
+            stmt = select(selected, pages.c.page_namespace == namespace,
+                          order_by=[pages.c.page_id], limit=batch_size)
+
+            if last_id is not None:
+                stmt = stmt.where(pages.c.page_id > last_id)
+
+            if max_id is not None:
+                stmt = stmt.where(pages.c.page_id <= max_id)
+
+            rows = session.execute(stmt).fetchall()
+
+            if not rows:
+                return
+
+            last_id = rows[-1][key_index]
+
+            for row in rows:
+                values = tuple(row)[:width]
+                if record_cls is None:
+                    yield values
+                else:
+                    yield record_cls(*values)
+
+    def map_articles(self, func, workers=None, reduce=None,
+                     initial=parallel._empty, columns=default_row_columns,
+                     batch_size=1000, retries=2):
+        """Map a function over all article rows in worker processes.
+
+        The page id space is split into ranges which are processed by a pool
+        of worker processes. Every worker opens its own connection to the
+        database. A range that fails is retried and does not affect the
+        other ranges.
+
+        func and reduce are sent to the workers and therefore have to be
+        picklable, for example functions defined at module level.
+
+        :param func:        Function that is called with every row tuple
+        :type func:         callable
+
+        :param workers:     Number of worker processes. Defaults to the
+                            number of CPUs.
+        :type workers:      int
+
+        :param reduce:      Associative and commutative function that
+                            combines two results. Results of a range are
+                            combined in the worker, the results of all
+                            ranges in the calling process.
+        :type reduce:       callable
+
+        :param initial:     Initial value for reduce
+        :type initial:      object
+
+        :param columns:     Names of the page columns passed to func
+        :type columns:      sequence
+
+        :param batch_size:  Number of rows that will be fetched
+                            simultaneously by every worker.
+        :type batch_size:   int
+
+        :param retries:     Number of retries for failing ranges
+        :type retries:      int
+
+        :return:            The combined result if reduce is given, a list
+                            of all results ordered by page id otherwise.
+
+        :raises MapError:   If some ranges failed permanently. The error
+                            carries the result of all other ranges.
+        """
+        return self._map('Article', 0, func, workers, reduce, initial,
+                         columns, batch_size, retries)
+
+    def map_categories(self, func, workers=None, reduce=None,
+                       initial=parallel._empty, columns=default_row_columns,
+                       batch_size=1000, retries=2):
+        """Map a function over all category rows in worker processes.
+
+        See map_articles for a description of the parameters.
+        """
+        return self._map('Category', 14, func, workers, reduce, initial,
+                         columns, batch_size, retries)
+
+    def _map(self, cls_name, namespace, func, workers, reduce, initial,
+             columns, batch_size, retries):
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return None
+
+        return parallel.map_pages(lang_db, namespace, func, columns, workers,
+                                  reduce, initial, batch_size, retries)
+
+    def scan_articles(self, batch_size=500, checkpoint=None, load=None,
+                      streaming=False):
+        """Resumable article scan in constant memory.
+
+        :param batch_size:  Number of articles that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+
+        :param checkpoint:  Checkpoint token of an earlier scan
+        :type checkpoint:   string
+
+        :param load:        Loading profiles or relations that are loaded
+                            together with every batch
+        :type load:         sequence
+
+        :param streaming:   Read through a read-only session that forgets
+                            every batch once it is consumed
+        :type streaming:    bool
+
+        :rtype:             KeysetScan
+        """
+        return self._scan('Article', batch_size, checkpoint,
+                          load_options(load or ()), streaming)
+
+    def scan_categories(self, batch_size=500, checkpoint=None, load=None,
+                        streaming=False):
+        """Resumable category scan in constant memory.
+
+        :param batch_size:  Number of categories that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+
+        :param checkpoint:  Checkpoint token of an earlier scan
+        :type checkpoint:   string
+
+        :param load:        Loading profiles or relations that are loaded
+                            together with every batch
+        :type load:         sequence
+
+        :param streaming:   Read through a read-only session that forgets
+                            every batch once it is consumed
+        :type streaming:    bool
+
+        :rtype:             KeysetScan
+        """
+        return self._scan('Category', batch_size, checkpoint,
+                          load_options(load or ()), streaming)
+
+    def _scan(self, cls_name, batch_size, checkpoint, options=(),
+              streaming=False):
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return None
+
+        # make sure the mapped classes exist
+        lang_db.session
+
+        return KeysetScan(lang_db, lang_db.get_class(cls_name), batch_size,
+                          checkpoint, options, streaming)
+
+    def get_article(self, title, follow_redirects=False):
+        """Get article with given title.
+
+        :param title:   Title of the article
+        :type title:    string
+
+        :param follow_redirects:    Return the target of the article if it is
+                                    a redirect. Broken redirects and
+                                    redirect loops yield None.
+        :type follow_redirects:     bool
+        """
         title = markup.wikify(title)
         lang_db = mwdb.databases.get_database(self.language)
 
@@ -92,12 +610,20 @@ class Wikipedia(object):
                 self))
             return None
 
-        try:
-            return lang_db.session.query(
-                lang_db.get_class('Article')).filter_by(title=title).one()
-        except orm_exc.NoResultFound as no_res_err:
+        article = self._get_page(lang_db, 'Article', 0, title)
+
+        if not (follow_redirects and article is not None and
+                article.is_redirect):
+            return article
+
+        target_id = self._resolve_redirects(lang_db, [article.id])[article.id]
+
+        if target_id is None:
             return None
 
+        cls = lang_db.get_class('Article')
+        return lang_db.session.query(cls).filter(cls.id == target_id).first()
+
     def get_category(self, title):
         title = markup.clean_title(title, self.language, 14)
         lang_db = mwdb.databases.get_database(self.language)
@@ -107,8 +633,507 @@ class Wikipedia(object):
                 self))
             return None
 
+        return self._get_page(lang_db, 'Category', 14, title)
+
+    def get_articles(self, titles, chunk_size=None, follow_redirects=False):
+        """Get articles for many titles at once.
+
+        The titles are looked up in chunks with one query per chunk instead of
+        one query per title.
+
+        :param titles:      Article titles
+        :type titles:       iterable
+
+        :param chunk_size:  Number of titles that will be looked up with a
+                            single query. Defaults to title_chunk_size.
+        :type chunk_size:   int
+
+        :param follow_redirects:    Map titles of redirects to the target
+                                    articles. Broken redirects and redirect
+                                    loops are mapped to None.
+        :type follow_redirects:     bool
+
+        :return:            Dictionary mapping the given titles to articles.
+                            Titles without an article are mapped to None.
+        :rtype:             dict
+        """
+        articles = self._get_pages('Article', 0, titles, markup.wikify,
+                                   chunk_size)
+
+        if not follow_redirects or articles is None:
+            return articles
+
+        lang_db = mwdb.databases.get_database(self.language)
+        redirect_ids = set(a.id for a in articles.itervalues()
+                           if a is not None and a.is_redirect)
+
+        if not redirect_ids:
+            return articles
+
+        targets = self._resolve_redirects(lang_db, redirect_ids, chunk_size)
+        cls = lang_db.get_class('Article')
+        target_ids = list(set(t for t in targets.itervalues()
+                              if t is not None))
+        target_articles = {}
+
+        if chunk_size is None:
+            chunk_size = title_chunk_size
+
+        for start in range(0, len(target_ids), chunk_size):
+            chunk = target_ids[start:start + chunk_size]
+            for article in lang_db.session.query(cls).filter(
+                cls.id.in_(chunk)):
+                target_articles[article.id] = article
+
+        for title, article in articles.items():
+            if article is not None and article.id in targets:
+                articles[title] = target_articles.get(targets[article.id])
+
+        return articles
+
+    def preload_redirects(self, batch_size=10000):
+        """Precompute the targets of all redirects in this language.
+
+        The whole redirect table is read once and all redirect chains are
+        collapsed in memory, so that subsequent redirect resolution does not
+        need any queries.
+
+        :param batch_size:  Number of redirects that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return None
+
+        direct = {}
+        # targets that are redirect pages themselves
+        redirect_pages = set()
+        session = lang_db.session
+        rd = lang_db.get_table('redirect')
+        pages = lang_db.get_table('page')
+
+        _log.debug('{0.language}: Load redirect table'.format(self))
+        result = session.execute(
+            select([rd.c.rd_from, pages.c.page_id, pages.c.page_is_redirect],
+                   and_(pages.c.page_namespace == rd.c.rd_namespace,
+                        pages.c.page_title == rd.c.rd_title)))
+
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            for source_id, target_id, is_redirect in rows:
+                direct[source_id] = target_id
+                if is_redirect:
+                    redirect_pages.add(target_id)
+
+        _log.debug('{0.language}: Collapse {1} redirects'.format(
+            self, len(direct)))
+        for source_id in direct:
+            if source_id in lang_db.redirect_targets:
+                continue
+
+            chain = [source_id]
+            target_id = direct[source_id]
+
+            while target_id in direct and len(chain) <= max_redirect_hops:
+                if target_id in chain:
+                    _log.debug('{0.language}: Redirect loop at {1}'.format(
+                        self, source_id))
+                    target_id = None
+                    break
+                chain.append(target_id)
+                target_id = direct[target_id]
+            else:
+                # chains that are too long or end in a broken redirect
+                if target_id in direct or target_id in redirect_pages:
+                    target_id = None
+
+            for page_id in chain:
+                lang_db.redirect_targets[page_id] = target_id
+
+    def _resolve_redirects(self, lang_db, page_ids, chunk_size=None):
+        """Resolve redirect chains.
+
+        Redirects are followed with one query per hop for all given pages.
+        Resolved targets are stored in the redirect_targets map of the
+        language database, so every redirect is resolved only once.
+
+        :param lang_db:     Database of this language
+        :type lang_db:      mwdb.orm.database.Database
+
+        :param page_ids:    Ids of redirect pages
+        :type page_ids:     iterable
+
+        :return:            Dictionary mapping the given page ids to the ids
+                            of their final targets. Broken redirects, loops
+                            and chains longer than max_redirect_hops are
+                            mapped to None.
+        :rtype:             dict
+        """
+        if chunk_size is None:
+            chunk_size = title_chunk_size
+
+        targets = {}
+        # origin -> pages visited while following the redirect chain
+        chains = {}
+
+        for page_id in page_ids:
+            if page_id in lang_db.redirect_targets:
+                targets[page_id] = lang_db.redirect_targets[page_id]
+            else:
+                chains[page_id] = [page_id]
+
+        rd = lang_db.get_table('redirect')
+        pages = lang_db.get_table('page')
+        hops = 0
+
+        while chains and hops < max_redirect_hops:
+            hops += 1
+            current = list(set(chain[-1] for chain in chains.itervalues()))
+            step = {}
+
+            for start in range(0, len(current), chunk_size):
+                chunk = current[start:start + chunk_size]
+                for source_id, target_id, is_redirect in \
+                        lang_db.session.execute(select(
+                            [rd.c.rd_from, pages.c.page_id,
+                             pages.c.page_is_redirect],
+                            and_(rd.c.rd_from.in_(chunk),
+                                 pages.c.page_namespace == rd.c.rd_namespace,
+                                 pages.c.page_title == rd.c.rd_title))):
+                    step[source_id] = (target_id, is_redirect)
+
+            for origin, chain in chains.items():
+                target_id, is_redirect = step.get(chain[-1], (None, False))
+
+                if target_id in lang_db.redirect_targets:
+                    target_id = lang_db.redirect_targets[target_id]
+                    is_redirect = False
+                elif target_id in chain:
+                    _log.debug('{0.language}: Redirect loop at {1}'.format(
+                        self, origin))
+                    target_id = None
+                    is_redirect = False
+
+                if is_redirect:
+                    chain.append(target_id)
+                    continue
+
+                # collapse the chain, all pages on it share the final target
+                for page_id in chain:
+                    lang_db.redirect_targets[page_id] = target_id
+                targets[origin] = target_id
+                del chains[origin]
+
+        for origin, chain in chains.iteritems():
+            _log.debug('{0.language}: Redirect chain too long at {1}'.format(
+                self, origin))
+            for page_id in chain:
+                lang_db.redirect_targets[page_id] = None
+            targets[origin] = None
+
+        return targets
+
+    def get_categories(self, titles, chunk_size=None):
+        """Get categories for many titles at once.
+
+        The titles are looked up in chunks with one query per chunk instead of
+        one query per title.
+
+        :param titles:      Category titles
+        :type titles:       iterable
+
+        :param chunk_size:  Number of titles that will be looked up with a
+                            single query. Defaults to title_chunk_size.
+        :type chunk_size:   int
+
+        :return:            Dictionary mapping the given titles to categories.
+                            Titles without a category are mapped to None.
+        :rtype:             dict
+        """
+        return self._get_pages(
+            'Category', 14, titles,
+            lambda t: markup.clean_title(t, self.language, 14), chunk_size)
+
+    def iter_texts(self, page_ids=None, batch_size=500, slice_size=None,
+                   namespace=0, workers=None):
+        """Latest texts of many pages.
+
+        Pages and texts are read together with one page/text join per batch
+        of pages. Texts are decoded according to their flags (see
+        text.decode_text).
+
+        :param page_ids:    Ids of the pages. If None the texts of all pages
+                            in namespace are returned in page id order.
+        :type page_ids:     iterable
+
+        :param batch_size:  Number of texts that will be fetched
+                            simultaneously from the database.
+        :type batch_size:   int
+
+        :param slice_size:  Stream every text in slices of this number of
+                            characters instead of reading it at once (see
+                            text.iter_text_slices).
+        :type slice_size:   int
+
+        :param namespace:   Namespace of the pages if page_ids is None
+        :type namespace:    int
+
+        :param workers:     Number of threads that decompress the texts of a
+                            batch. zlib releases the GIL, so compressed texts
+                            are decoded in parallel.
+        :type workers:      int
+
+        :return:            Generator of (page id, text) tuples. With
+                            slice_size the text is a generator of slices.
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return None
+
+        return self._iter_texts(lang_db, page_ids, batch_size, slice_size,
+                                namespace, workers)
+
+    def _iter_texts(self, lang_db, page_ids, batch_size, slice_size,
+                    namespace, workers):
+        session = lang_db.session
+        pages = lang_db.get_table('page')
+        texts = lang_db.get_table('text')
+
+        if slice_size is not None:
+            for batch in self._iter_text_batches(
+                session, pages, texts,
+                [pages.c.page_id, texts.c.old_id, texts.c.old_flags],
+                page_ids, batch_size, namespace):
+                for page_id, text_id, flags in batch:
+                    yield page_id, text.iter_text_slices(
+                        lang_db, text_id, slice_size, flags)
+            return
+
+        pool = None
+        if workers:
+            pool = multiprocessing.pool.ThreadPool(workers)
+
         try:
-            return lang_db.session.query(
-                lang_db.get_class('Category')).filter_by(title=title).one()
-        except orm_exc.NoResultFound as no_res_err:
+            for batch in self._iter_text_batches(
+                session, pages, texts,
+                [pages.c.page_id, texts.c.old_id, texts.c.old_text,
+                 texts.c.old_flags],
+                page_ids, batch_size, namespace):
+                if pool is None:
+                    decoded = [_decode_row(row) for row in batch]
+                else:
+                    decoded = pool.map(_decode_row, batch)
+
+                for row in decoded:
+                    yield row
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _iter_text_batches(self, session, pages, texts, columns, page_ids,
+                           batch_size, namespace):
+        """Batches of page/text rows with the page id as first column"""
+        joined = pages.c.page_latest == texts.c.old_id
+
+        if page_ids is None:
+            last_id = None
+
+            while True:
+                criterion = and_(joined, pages.c.page_namespace == namespace)
+                if last_id is not None:
+                    criterion = and_(criterion, pages.c.page_id > last_id)
+
+                rows = session.execute(select(
+                    columns, criterion, order_by=[pages.c.page_id],
+                    limit=batch_size)).fetchall()
+
+                if not rows:
+                    return
+
+                yield rows
+
+                last_id = rows[-1][0]
+
+        page_ids = iter(page_ids)
+
+        while True:
+            chunk = list(itertools.islice(page_ids, batch_size))
+
+            if not chunk:
+                return
+
+            loaded = dict((row[0], row) for row in session.execute(select(
+                columns, and_(joined, pages.c.page_id.in_(chunk)))))
+
+            yield [loaded[page_id] for page_id in chunk if page_id in loaded]
+
+    def iter_linked_articles(self, articles, batch_size=1000):
+        """Articles linked from many articles.
+
+        Links are resolved with one pagelinks/page join per batch of source
+        articles and streamed as they arrive.
+
+        :param articles:    Source articles of this language
+        :type articles:     iterable
+
+        :param batch_size:  Number of source articles whose links are read
+                            with a single query.
+        :type batch_size:   int
+
+        :return:            Generator of (source article, linked article)
+                            tuples
+        """
+        return self._iter_links(articles, False, batch_size)
+
+    def iter_linked_from_articles(self, articles, batch_size=1000):
+        """Articles linking to many articles.
+
+        See iter_linked_articles.
+
+        :return:            Generator of (target article, linking article)
+                            tuples
+        """
+        return self._iter_links(articles, True, batch_size)
+
+    def _iter_links(self, articles, incoming, batch_size):
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return
+
+        query, key = linked_articles_query(lang_db, incoming)
+        articles = iter(articles)
+
+        while True:
+            batch = list(itertools.islice(articles, batch_size))
+
+            if not batch:
+                return
+
+            if incoming:
+                keys = dict((article.title, article) for article in batch)
+            else:
+                keys = dict((article.id, article) for article in batch)
+
+            for linked, link_key in query.filter(
+                key.in_(list(keys))).order_by(key).yield_per(batch_size):
+                yield keys[link_key], linked
+
+    def _get_page(self, lang_db, cls_name, namespace, title):
+        """Get page of given class for a normalised title.
+
+        Lookups go through the title cache of the language database, which
+        maps (namespace, title) to page ids. Titles without a page are cached
+        as well.
+        """
+        session = lang_db.session
+        cls = lang_db.get_class(cls_name)
+        key = (namespace, title)
+
+        try:
+            page_id = lang_db.title_cache[key]
+        except KeyError:
+            try:
+                page = session.query(cls).filter_by(title=title).one()
+            except orm_exc.NoResultFound as no_res_err:
+                page = None
+
+            lang_db.title_cache[key] = page.id if page is not None else None
+            return page
+
+        if page_id is None:
             return None
+
+        # served from the identity map if the page is still in the session
+        return session.query(cls).get(page_id)
+
+    def _get_pages(self, cls_name, namespace, titles, normalise,
+                   chunk_size=None):
+        """Get pages of given class for many titles at once.
+
+        :param cls_name:    Name of the mapped class (Article, Category, ...)
+        :type cls_name:     string
+
+        :param namespace:   Namespace of the pages
+        :type namespace:    int
+
+        :param titles:      Page titles
+        :type titles:       iterable
+
+        :param normalise:   Function that turns a title into the form used
+                            in the database
+        :type normalise:    callable
+
+        :param chunk_size:  Number of titles that will be looked up with a
+                            single query.
+        :type chunk_size:   int
+        """
+        lang_db = mwdb.databases.get_database(self.language)
+
+        if lang_db is None:
+            _log.warning('Database missing for language: {0.language}'.format(
+                self))
+            return None
+
+        if chunk_size is None:
+            chunk_size = title_chunk_size
+
+        # several given titles might share a single normalised title
+        wanted = {}
+        pages = {}
+        for title in titles:
+            wanted.setdefault(normalise(title), []).append(title)
+            pages[title] = None
+
+        session = lang_db.session
+        cls = lang_db.get_class(cls_name)
+
+        # split titles into those with cached page ids and unknown ones,
+        # titles cached as missing need no query at all
+        cached_ids = []
+        unknown = []
+        for norm_title in wanted:
+            page_id = lang_db.title_cache.get((namespace, norm_title),
+                                              _missing)
+            if page_id is _missing:
+                unknown.append(norm_title)
+            elif page_id is not None:
+                cached_ids.append(page_id)
+
+        for start in range(0, len(cached_ids), chunk_size):
+            chunk = cached_ids[start:start + chunk_size]
+            _log.debug('{0.language}: Load {1} cached pages'.format(
+                self, len(chunk)))
+
+            for page in session.query(cls).filter(cls.id.in_(chunk)):
+                for title in wanted.get(page.title, []):
+                    pages[title] = page
+
+        for start in range(0, len(unknown), chunk_size):
+            chunk = unknown[start:start + chunk_size]
+            _log.debug('{0.language}: Look up {1} titles'.format(
+                self, len(chunk)))
+
+            found = set()
+            for page in session.query(cls).filter(cls.title.in_(chunk)):
+                found.add(page.title)
+                lang_db.title_cache[(namespace, page.title)] = page.id
+                for title in wanted.get(page.title, []):
+                    pages[title] = page
+
+            for norm_title in chunk:
+                if norm_title not in found:
+                    lang_db.title_cache[(namespace, norm_title)] = None
+
+        return pages
@@ -19,6 +19,10 @@
 
 from __future__ import absolute_import
 
+from . import advisor
+from . import cache
 from . import database
+from . import importer
+from . import indexer
 from . import mapper
 from . import tables
@@ -0,0 +1,443 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""EXPLAIN based index advisor for PostgreSQL databases.
+
+A representative workload of lookups and relations of pages, articles and
+categories is run against a language database while the generated SQL is
+captured. Every captured query is run again with EXPLAIN (ANALYZE, BUFFERS).
+Sequential scans on large tables are reported together with the columns an
+index would need, in the format of tables.postgresql.indexed_columns.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import itertools
+import json
+import logging
+import re
+
+import mwdb
+
+from sqlalchemy import and_, func, select
+
+try:
+    from sqlalchemy import event
+except ImportError as imp_err:
+    # SQLAlchemy < 0.7 has no engine events
+    event = None
+
+from .tables import postgresql as postgresql_tables
+
+_log = logging.getLogger(__name__)
+
+# tables with at least this many rows are considered large
+large_table_rows = 100000
+
+# number of items consumed from every iterator of the workload
+workload_items = 20
+
+# plan keys that hold join conditions of child nodes
+_join_condition_keys = ('Hash Cond', 'Merge Cond', 'Join Filter')
+
+
+class Finding(object):
+    """Sequential scan on a large table.
+
+    :ivar statement:    Captured SQL statement
+    :ivar table:        Scanned table
+    :ivar rows:         Estimated number of rows of the table
+    :ivar time:         Execution time of the statement in milliseconds
+    :ivar columns:      Columns an index would need, empty if unknown
+    """
+
+    def __init__(self, statement, table, rows, time, columns):
+        self.statement = statement
+        self.table = table
+        self.rows = rows
+        self.time = time
+        self.columns = columns
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({0.table}, {0.columns!r}, ' \
+               '{0.time:.1f}ms)'.format(self)
+
+
+class SQLCapture(object):
+    """Contextmanager that records the SELECT statements of an engine.
+
+    Engine events are used if available. Older SQLAlchemy versions are
+    handled by wrapping do_execute of the dialect.
+
+    :ivar statements:   List of (statement, parameters) tuples
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self._do_execute = None
+
+    def _record(self, statement, parameters):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            self.statements.append((statement, parameters))
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters,
+                               context, executemany):
+        if not executemany:
+            self._record(statement, parameters)
+
+    def __enter__(self):
+        if event is not None:
+            event.listen(self.engine, 'before_cursor_execute',
+                         self._before_cursor_execute)
+            return self
+
+        dialect = self.engine.dialect
+        self._do_execute = dialect.do_execute
+
+        def do_execute(cursor, statement, parameters, *args, **kwargs):
+            self._record(statement, parameters)
+            return self._do_execute(cursor, statement, parameters, *args,
+                                    **kwargs)
+
+        dialect.do_execute = do_execute
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if event is not None:
+            event.remove(self.engine, 'before_cursor_execute',
+                         self._before_cursor_execute)
+        else:
+            self.engine.dialect.do_execute = self._do_execute
+
+
+def _sample_titles(lang_db, namespace, samples):
+    """Titles of pages spread evenly over the page id range of a namespace.
+
+    Pages with the lowest ids are often the oldest and best linked ones, so
+    they would not represent the workload.
+    """
+    session = lang_db.session
+    pages = lang_db.get_table('page')
+    in_namespace = pages.c.page_namespace == namespace
+
+    min_id, max_id = session.execute(select(
+        [func.min(pages.c.page_id), func.max(pages.c.page_id)],
+        in_namespace)).fetchone()
+
+    if min_id is None or not samples:
+        return []
+
+    step = max(float(max_id - min_id) / samples, 1)
+    titles = []
+
+    for i in range(samples):
+        row = session.execute(select(
+            [pages.c.page_title],
+            and_(in_namespace, pages.c.page_id >= min_id + int(i * step)),
+            order_by=[pages.c.page_id], limit=1)).fetchone()
+
+        if row is not None and row[0] not in titles:
+            titles.append(row[0])
+
+    return titles
+
+
+def _workload(lang_db, samples):
+    """Calls that exercise the lookups and relations of pages.
+
+    :return:    List of (description, function) tuples
+    """
+    wikipedia = mwdb.Wikipedia(lang_db.language)
+    titles = _sample_titles(lang_db, 0, samples)
+    cat_titles = _sample_titles(lang_db, 14, samples)
+
+    def consume(iterable):
+        return list(itertools.islice(iterable, workload_items))
+
+    calls = [('Wikipedia.get_articles',
+              lambda: wikipedia.get_articles(titles)),
+             ('Wikipedia.get_categories',
+              lambda: wikipedia.get_categories(cat_titles)),
+             ('Wikipedia.iter_articles', lambda: consume(
+                 wikipedia.iter_articles(workload_items))),
+             ('Wikipedia.iter_categories', lambda: consume(
+                 wikipedia.iter_categories(workload_items)))]
+
+    for title in titles:
+        calls.append(('Wikipedia.get_article', lambda title=title:
+                      wikipedia.get_article(title)))
+
+    for title in cat_titles:
+        calls.append(('Wikipedia.get_category', lambda title=title:
+                      wikipedia.get_category(title)))
+
+    def article_calls(article):
+        prefix = article.title[:2]
+        suffix = article.title[-2:]
+        return [
+            ('Page.categories', lambda: article.categories),
+            ('Page.language_links', lambda: article.language_links),
+            ('Page.revisions', lambda: article.revisions),
+            ('Page.redirect', lambda: getattr(article, 'redirect', None)),
+            ('Page.raw_text', lambda: article.raw_text),
+            ('Page.iter_raw_text', lambda: consume(
+                article.iter_raw_text(slice_size=1000))),
+            ('Page.iter_translations', lambda: consume(
+                article.iter_translations())),
+            ('Page.iter_categories_startwith', lambda: consume(
+                article.iter_categories_startwith(prefix))),
+            ('Page.iter_categories_endwith', lambda: consume(
+                article.iter_categories_endwith(suffix))),
+            ('Page.iter_categories_contain', lambda: consume(
+                article.iter_categories_contain(prefix))),
+            ('Article.article_links', lambda: article.article_links),
+            ('Article.article_links_in', lambda: article.article_links_in),
+            ('Article.iter_linked_articles', lambda: consume(
+                article.iter_linked_articles())),
+            ('Article.iter_linked_from_articles', lambda: consume(
+                article.iter_linked_from_articles()))]
+
+    def category_calls(category):
+        prefix = category.title[:2]
+        suffix = category.title[-2:]
+        return [
+            ('Category.subcategories', lambda: category.subcategories),
+            ('Category.member_pages', lambda: consume(category.member_pages)),
+            ('Category.iter_subcategories_startwith', lambda: consume(
+                category.iter_subcategories_startwith(prefix))),
+            ('Category.iter_subcategories_endwith', lambda: consume(
+                category.iter_subcategories_endwith(suffix))),
+            ('Category.iter_subcategories_contain', lambda: consume(
+                category.iter_subcategories_contain(prefix))),
+            ('Category.iter_member_page_startwith', lambda: consume(
+                category.iter_member_page_startwith(prefix))),
+            ('Category.iter_member_page_endwith', lambda: consume(
+                category.iter_member_page_endwith(suffix))),
+            ('Category.iter_member_page_contain', lambda: consume(
+                category.iter_member_page_contain(prefix))),
+            ('Category.iter_descendants', lambda: consume(
+                category.iter_descendants(max_depth=2))),
+            ('Category.iter_ancestors', lambda: consume(
+                category.iter_ancestors(max_depth=2))),
+            ('Category.iter_member_pages_recursive', lambda: consume(
+                category.iter_member_pages_recursive(max_depth=2)))]
+
+    articles = [article for article in wikipedia.get_articles(titles).values()
+                if article is not None]
+
+    calls.append(('Wikipedia.iter_texts', lambda: consume(
+        wikipedia.iter_texts([article.id for article in articles],
+                             batch_size=workload_items))))
+
+    for article in articles:
+        calls.extend(article_calls(article))
+
+    for category in wikipedia.get_categories(cat_titles).values():
+        if category is not None:
+            calls.extend(category_calls(category))
+
+    return calls
+
+
+def capture_workload(lang_db, samples=10):
+    """Run the workload and capture its SQL statements.
+
+    :return:    List of unique (statement, parameters) tuples
+    """
+    session = lang_db.session
+    statements = []
+    seen = set()
+
+    with SQLCapture(lang_db.engine) as capture:
+        for description, call in _workload(lang_db, samples):
+            try:
+                call()
+            except Exception as err:
+                _log.warning('{0.name}: {1} failed: {2}'.format(
+                    lang_db, description, err))
+                session.rollback()
+
+    for statement, parameters in capture.statements:
+        if statement not in seen:
+            seen.add(statement)
+            statements.append((statement, parameters))
+
+    _log.debug('{0.name}: Captured {1} statements'.format(
+        lang_db, len(statements)))
+    return statements
+
+
+def explain(lang_db, statement, parameters):
+    """Run a statement with EXPLAIN (ANALYZE, BUFFERS).
+
+    :return:    Plan in the JSON format of PostgreSQL
+    :rtype:     dict
+    """
+    conn = lang_db.engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + statement,
+                       parameters)
+        plan = cursor.fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    if not isinstance(plan, list):
+        plan = json.loads(plan)
+
+    return plan[0]
+
+
+def _mentioned_columns(text, table, alias=None):
+    """Columns of a table that appear in a plan condition, in order"""
+    if not text:
+        return []
+
+    found = []
+    for column in postgresql_tables.metadata.tables[table].columns:
+        if alias is not None:
+            pattern = r'\b{0}\.{1}\b'.format(re.escape(alias), column.name)
+        else:
+            pattern = r'\b{0}\b'.format(column.name)
+
+        match = re.search(pattern, text)
+        if match:
+            found.append((match.start(), column.name))
+
+    return [name for pos, name in sorted(found)]
+
+
+def _iter_seq_scans(node, conditions=()):
+    """Sequential scans of a plan with the join conditions above them"""
+    conditions = conditions + tuple(node[key] for key in _join_condition_keys
+                                    if key in node)
+
+    if node.get('Node Type') == 'Seq Scan':
+        yield node, conditions
+
+    for child in node.get('Plans', []):
+        for found in _iter_seq_scans(child, conditions):
+            yield found
+
+
+def _table_rows(lang_db):
+    """Estimated number of rows of all tables"""
+    return dict(lang_db.engine.execute(
+        "SELECT c.relname, c.reltuples FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = 'public' AND c.relkind = 'r'").fetchall())
+
+
+def advise(language, samples=10, min_rows=None):
+    """Find sequential scans on large tables in the queries of mwdb.
+
+    :param language:    Language code of the examined database
+    :type language:     string
+
+    :param samples:     Number of articles and categories used by the
+                        workload. They are sampled evenly over the page id
+                        range.
+    :type samples:      int
+
+    :param min_rows:    Number of rows that makes a table large. Defaults to
+                        large_table_rows.
+    :type min_rows:     int
+
+    :return:            List of findings ordered by execution time
+    :rtype:             list
+
+    :raises ValueError: If the database is not a PostgreSQL database
+    """
+    if min_rows is None:
+        min_rows = large_table_rows
+
+    lang_db = mwdb.databases.get_database(language)
+
+    if lang_db is None:
+        _log.warning('Database missing for language: {0}'.format(language))
+        return None
+
+    if lang_db.vendor != 'postgresql':
+        raise ValueError('The index advisor needs PostgreSQL')
+
+    table_rows = _table_rows(lang_db)
+    findings = []
+
+    for statement, parameters in capture_workload(lang_db, samples):
+        try:
+            plan = explain(lang_db, statement, parameters)
+        except Exception as err:
+            _log.warning('{0.name}: EXPLAIN failed: {1}'.format(lang_db, err))
+            continue
+
+        for node, conditions in _iter_seq_scans(plan['Plan']):
+            table = node.get('Relation Name')
+            rows = table_rows.get(table, 0)
+
+            if rows < min_rows:
+                continue
+
+            columns = []
+            if table in postgresql_tables.metadata.tables:
+                columns = _mentioned_columns(node.get('Filter'), table)
+                for condition in conditions:
+                    columns.extend(
+                        column for column in _mentioned_columns(
+                            condition, table, node.get('Alias', table))
+                        if column not in columns)
+
+            findings.append(Finding(statement, table, rows,
+                                    plan.get('Execution Time', 0.0),
+                                    tuple(columns)))
+
+    findings.sort(key=lambda finding: finding.time, reverse=True)
+    return findings
+
+
+def suggest_indexed_columns(findings):
+    """Index definitions that are missing from indexed_columns.
+
+    :param findings:    Findings of advise
+    :type findings:     list
+
+    :return:            Dictionary mapping table names to lists of column
+                        tuples, ready to be added to
+                        tables.postgresql.indexed_columns
+    :rtype:             dict
+    """
+    suggestions = {}
+
+    for finding in findings:
+        if not finding.columns:
+            continue
+
+        defined = [index_def if not isinstance(index_def, dict)
+                   else tuple(index_def['columns'])
+                   for index_def in postgresql_tables.indexed_columns.get(
+                       finding.table, [])]
+        suggested = suggestions.setdefault(finding.table, [])
+
+        if finding.columns not in defined and finding.columns not in suggested:
+            suggested.append(finding.columns)
+
+    return dict((table, columns) for table, columns in suggestions.items()
+                if columns)
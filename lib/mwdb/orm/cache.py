@@ -0,0 +1,285 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    """Size bounded least recently used cache.
+
+    The cache is safe to use from multiple threads and keeps counters of hits,
+    misses and evictions.
+
+    :ivar hits:         Number of successful lookups
+    :type hits:         int
+
+    :ivar misses:       Number of failed lookups
+    :type misses:       int
+
+    :ivar evictions:    Number of entries dropped because the cache was full
+    :type evictions:    int
+    """
+
+    def __init__(self, max_size=100000):
+        """Constructor.
+
+        :param max_size:    Maximum number of entries. A value of 0 disables
+                            the cache.
+        :type max_size:     int
+        """
+        super(LRUCache, self).__init__()
+
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({1}/{0.max_size})'.format(
+            self, len(self))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+
+            # re-insert to mark the entry as most recently used
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        if not self.max_size:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._entries[key]
+
+    def get(self, key, default=None):
+        """Get value for key or default if key is not in the cache"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self._lock:
+            _log.debug('Clear {0!r}'.format(self))
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        """Dictionary of hit, miss and eviction counters"""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self)}
+
+
+class TextCache(object):
+    """Size bounded text cache in a single sqlite file.
+
+    Texts are keyed by (database name, text id), because text rows never
+    change within a dump. Several processes can share the same file. When
+    the stored texts exceed max_bytes, the least recently used texts are
+    evicted until low_water of max_bytes is left. The time of last use is
+    only written when it is older than touch_interval, so hits rarely need
+    the write lock of the file.
+
+    Hits, misses and evictions are counted per process.
+    """
+
+    _schema = (
+        'CREATE TABLE IF NOT EXISTS texts ('
+        ' db TEXT NOT NULL, id INTEGER NOT NULL, text TEXT NOT NULL,'
+        ' size INTEGER NOT NULL, used REAL NOT NULL,'
+        ' PRIMARY KEY (db, id))',
+        'CREATE INDEX IF NOT EXISTS texts_used ON texts (used)',
+        'CREATE TABLE IF NOT EXISTS total (size INTEGER NOT NULL)',
+        'INSERT INTO total SELECT 0 WHERE NOT EXISTS (SELECT * FROM total)',
+        'CREATE TRIGGER IF NOT EXISTS texts_insert AFTER INSERT ON texts '
+        'BEGIN UPDATE total SET size = size + new.size; END',
+        'CREATE TRIGGER IF NOT EXISTS texts_delete AFTER DELETE ON texts '
+        'BEGIN UPDATE total SET size = size - old.size; END')
+
+    def __init__(self, path, max_bytes=1 << 30, low_water=0.9, timeout=30,
+                 touch_interval=300):
+        """Constructor.
+
+        :param path:        Path of the cache file
+        :type path:         string
+
+        :param max_bytes:   Maximum size of the stored texts in bytes
+        :type max_bytes:    int
+
+        :param low_water:   Fraction of max_bytes left after an eviction
+        :type low_water:    float
+
+        :param timeout:     Seconds to wait for a lock held by another
+                            process
+        :type timeout:      float
+
+        :param touch_interval:  Seconds after which a hit updates the time of
+                                last use of a text
+        :type touch_interval:   float
+        """
+        super(TextCache, self).__init__()
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._connection() as conn:
+            for statement in self._schema:
+                conn.execute(statement)
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({0.path!r})'.format(self)
+
+    def _connection(self):
+        """Connection of the current thread and process"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = sqlite3.connect(self.path, self.timeout)
+            local.conn.execute('PRAGMA journal_mode=WAL')
+            local.pid = os.getpid()
+        return local.conn
+
+    def get(self, db_name, text_id, default=None):
+        """Get cached text or default"""
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT text, used FROM texts WHERE db = ? AND id = ?',
+            (db_name, text_id)).fetchone()
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return default
+
+        text, used = row
+        now = time.time()
+
+        if now - used > self.touch_interval:
+            with conn:
+                conn.execute(
+                    'UPDATE texts SET used = ? WHERE db = ? AND id = ?',
+                    (now, db_name, text_id))
+
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def set(self, db_name, text_id, text):
+        """Store text and evict old texts if the cache is full"""
+        size = len(text.encode('utf8'))
+
+        if size > self.max_bytes:
+            return
+
+        with self._connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO texts VALUES (?, ?, ?, ?, ?)',
+                         (db_name, text_id, text, size, time.time()))
+
+            total = conn.execute('SELECT size FROM total').fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total - int(self.max_bytes * self.low_water))
+
+    def _evict(self, conn, excess):
+        """Delete least recently used texts of at least excess bytes"""
+        freed = 0
+        evicted = []
+
+        for db_name, text_id, size in conn.execute(
+            'SELECT db, id, size FROM texts ORDER BY used'):
+            if freed >= excess:
+                break
+            evicted.append((db_name, text_id))
+            freed += size
+
+        conn.executemany('DELETE FROM texts WHERE db = ? AND id = ?', evicted)
+        with self._lock:
+            self.evictions += len(evicted)
+
+        _log.debug('{0!r}: Evicted {1} texts ({2} bytes)'.format(
+            self, len(evicted), freed))
+
+    def clear(self):
+        """Remove all texts from the cache"""
+        with self._connection() as conn:
+            conn.execute('DELETE FROM texts')
+
+    @property
+    def stats(self):
+        """Dictionary of hit, miss and eviction counters of this process"""
+        with self._connection() as conn:
+            count, = conn.execute('SELECT count(*) FROM texts').fetchone()
+            size, = conn.execute('SELECT size FROM total').fetchone()
+
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+
+        lookups = hits + misses
+        return {'hits': hits,
+                'misses': misses,
+                'hit_rate': float(hits) / lookups if lookups else 0.0,
+                'evictions': evictions,
+                'size': count,
+                'bytes': size}
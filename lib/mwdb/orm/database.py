@@ -21,20 +21,42 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import datetime
+import functools
+import hashlib
+import itertools
 import logging
+import os
 import re
+import tempfile
+import threading
+import time
+import weakref
+
+try:
+    import cPickle as pickle
+except ImportError as imp_err:
+    import pickle
 
 from contextlib import contextmanager
 
+import sqlalchemy.exc as sa_exc
+
 from sqlalchemy import *
 from sqlalchemy.orm import *
+from sqlalchemy.interfaces import PoolListener
 from sqlalchemy.schema import AddConstraint, DropConstraint
 
 from .. import exceptions
+from . import cache
 from . import mapper
 from .tables import generic as generic_tables
 from .tables import postgresql as postgresql_tables
 
+try:
+    import asyncio
+except ImportError as imp_err:
+    asyncio = None
+
 try:
     import psycopg2.extensions as e
     ISOLATION_LEVEL_AUTOCOMMIT = e.ISOLATION_LEVEL_AUTOCOMMIT
@@ -48,6 +70,390 @@ except ImportError as imp_err:
 _log = logging.getLogger(__name__)
 
 
+class _CountedConnection(object):
+    """DBAPI connection that frees its connection slot when it is closed.
+
+    Pools do not report closed connections, but they close the DBAPI
+    connection whenever they dispose, recycle or invalidate it. All other
+    attributes are those of the wrapped connection. A connection that is
+    garbage collected without being closed frees its slot as well.
+    """
+
+    def __init__(self, connection, release):
+        self.__dict__['_connection'] = connection
+        self.__dict__['_release'] = release
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)
+
+    def __del__(self):
+        self._free()
+
+    def close(self):
+        try:
+            self._connection.close()
+        finally:
+            self._free()
+
+    def _free(self):
+        # the slot must only be freed once
+        release = self.__dict__.pop('_release', None)
+        if release is not None:
+            release()
+
+
+class _EngineUsage(PoolListener):
+    """Pool listener that tracks the connections of a single engine.
+
+    New connections are opened by create_connection, which reserves a slot
+    in the registry first. The slot is freed when the pool closes the
+    connection (see _CountedConnection).
+    """
+
+    def __init__(self, registry, pool_recycle):
+        self.registry = registry
+        self.pool_recycle = pool_recycle
+        self.engine = None
+        self.in_use = 0
+        self.last_used = None
+        # engines are not disposed by processes forked from their creator
+        self.pid = os.getpid()
+        self._connect = None
+
+    def create_connection(self):
+        """Open a new DBAPI connection, wait for a free slot first"""
+        self.registry._acquire(self)
+        try:
+            connection = self._connect()
+        except Exception:
+            self.registry._release()
+            raise
+
+        return _CountedConnection(connection, self.registry._release)
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        with self.registry._lock:
+            self.in_use += 1
+
+    def checkin(self, dbapi_con, con_record):
+        with self.registry._lock:
+            self.in_use -= 1
+            self.last_used = time.time()
+
+
+class EngineRegistry(object):
+    """Registry of all engines of this process.
+
+    Administrative engines are shared by all databases on the same host and
+    the number of open connections can be limited for all engines together.
+    The limit is enforced when connections are opened, idle pooled
+    connections count as well. If the limit is reached, the pooled
+    connections of engines without connections in use are closed before
+    waiting for a free slot. Pooled connections of engines that were not
+    used for longer than their pool_recycle time are closed as well.
+
+    :ivar max_connections:  Maximum number of open connections or None for
+                            no limit
+    :type max_connections:  int
+
+    :ivar checkout_timeout: Seconds to wait for a free connection slot
+    :type checkout_timeout: float
+
+    :ivar reap_interval:    Minimum number of seconds between two searches
+                            for idle engines
+    :type reap_interval:    float
+    """
+
+    def __init__(self):
+        super(EngineRegistry, self).__init__()
+
+        self.max_connections = None
+        self.checkout_timeout = 30
+        self.reap_interval = 60
+
+        self._admin_engines = {}
+        self._usages = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(threading.Lock())
+        self._open = 0
+        self._last_reap = time.time()
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({1}, {0._open})'.format(
+            self, len(self._usages))
+
+    @property
+    def open_connections(self):
+        """Number of open connections"""
+        return self._open
+
+    @property
+    def in_use(self):
+        """Number of connections in use"""
+        with self._lock:
+            return sum(usage.in_use for usage in self._usages)
+
+    def admin_engine(self, url):
+        """Get the shared administrative engine for given URL.
+
+        :param url:     Database URL
+        :type url:      string
+        """
+        with self._lock:
+            engine = self._admin_engines.get(url)
+
+        if engine is None:
+            engine = self.create_engine(url)
+            with self._lock:
+                # keep the engine of a concurrent call if there was one
+                engine = self._admin_engines.setdefault(url, engine)
+
+        return engine
+
+    def create_engine(self, url, pool_recycle=300, **kwargs):
+        """Create a new engine whose connections are tracked.
+
+        :param url:     Database URL
+        :type url:      string
+        """
+        usage = _EngineUsage(self, pool_recycle)
+        engine = create_engine(url, listeners=[usage],
+                               pool_recycle=pool_recycle,
+                               creator=usage.create_connection, **kwargs)
+
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        usage._connect = functools.partial(engine.dialect.connect, *cargs,
+                                           **cparams)
+        usage.engine = engine
+
+        with self._lock:
+            self._usages.append(usage)
+
+        return engine
+
+    def dispose_idle(self):
+        """Close pooled connections of engines that are idle.
+
+        An engine is idle if none of its connections is in use and it was
+        not used for longer than its pool_recycle time.
+
+        :return:    Number of disposed engines
+        :rtype:     int
+        """
+        with self._lock:
+            self._last_reap = time.time()
+
+        return self._dispose_idle()
+
+    def _dispose_idle(self, unused=False, exclude=None):
+        """Dispose engines without connections in use.
+
+        Engines inherited from a parent process are never disposed, their
+        connections belong to the parent.
+
+        :param unused:  Dispose all engines without connections in use, not
+                        only those idle for longer than pool_recycle
+        :type unused:   bool
+
+        :param exclude: Usage of an engine that is kept
+        :type exclude:  _EngineUsage
+        """
+        now = time.time()
+        pid = os.getpid()
+        disposed = 0
+
+        with self._lock:
+            usages = [usage for usage in self._usages
+                      if usage is not exclude and usage.pid == pid and
+                      usage.in_use == 0 and
+                      usage.last_used is not None and
+                      (unused or now - usage.last_used > usage.pool_recycle)]
+            for usage in usages:
+                usage.last_used = None
+
+        for usage in usages:
+            _log.debug('Dispose idle engine: {0}'.format(usage.engine.url))
+            usage.engine.dispose()
+            disposed += 1
+
+        return disposed
+
+    def _acquire(self, usage=None):
+        """Reserve a connection slot, wait if the limit is reached"""
+        if time.time() - self._last_reap > self.reap_interval:
+            self.dispose_idle()
+
+        deadline = time.time() + self.checkout_timeout
+        freed = False
+
+        while True:
+            with self._available:
+                if (self.max_connections is None or
+                    self._open < self.max_connections):
+                    self._open += 1
+                    return
+
+                if freed:
+                    remaining = deadline - time.time()
+
+                    if remaining <= 0:
+                        raise exceptions.ConnectionLimitError(
+                            'All {0} connections open'.format(
+                                self.max_connections))
+
+                    self._available.wait(remaining)
+                    continue
+
+            # closing connections frees slots through _release, which needs
+            # the condition, so pools are disposed outside of it
+            self._dispose_idle(unused=True, exclude=usage)
+            freed = True
+
+    def _release(self):
+        """Free a connection slot"""
+        with self._available:
+            self._open -= 1
+            self._available.notify()
+
+
+# engines of all databases in this process
+engines = EngineRegistry()
+
+
+def _current_task():
+    """Get the running asyncio task or None"""
+    if asyncio is None:
+        return None
+
+    try:
+        return asyncio.current_task()
+    except RuntimeError as rt_err:
+        # no running event loop
+        return None
+    except AttributeError as attr_err:
+        # Python < 3.7
+        return asyncio.Task.current_task()
+
+
+class SessionRegistry(object):
+    """Registry of sessions scoped to threads or asyncio tasks.
+
+    With scope 'thread' every thread gets its own session. With scope
+    'task' every asyncio task gets its own session, which is closed when the
+    task is done. Code that does not run in a task gets a session per
+    thread.
+    """
+
+    def __init__(self, session_factory, scope='thread'):
+        """Constructor.
+
+        :param session_factory: Callable returning new sessions
+        :type session_factory:  callable
+
+        :param scope:           Session scope ('thread' or 'task')
+        :type scope:            string
+        """
+        if scope not in ('thread', 'task'):
+            raise ValueError('Unsupported session scope: {0}'.format(scope))
+
+        self.session_factory = session_factory
+        self.scope = scope
+
+        self._local = threading.local()
+        self._tasks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        task = _current_task() if self.scope == 'task' else None
+
+        if task is not None:
+            with self._lock:
+                session = self._tasks.get(task)
+
+            if session is None:
+                session = self.session_factory()
+                self.set(session)
+            return session
+
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.session_factory()
+            self._local.session = session
+        return session
+
+    def set(self, session):
+        """Make given session the session of the current scope"""
+        task = _current_task() if self.scope == 'task' else None
+
+        if task is None:
+            self._local.session = session
+            return
+
+        with self._lock:
+            new_task = task not in self._tasks
+            self._tasks[task] = session
+
+        if new_task:
+            task.add_done_callback(self._task_done)
+
+    def current(self):
+        """Session of the current scope or None if it has none yet"""
+        task = _current_task() if self.scope == 'task' else None
+
+        if task is None:
+            return getattr(self._local, 'session', None)
+
+        with self._lock:
+            return self._tasks.get(task)
+
+    def swap(self, session):
+        """Replace the session of the current scope without closing it.
+
+        :param session: New session of the current scope or None
+        :type session:  sqlalchemy.orm.session.Session
+
+        :return:        Previous session of the current scope or None
+        """
+        task = _current_task() if self.scope == 'task' else None
+
+        if task is None:
+            previous = getattr(self._local, 'session', None)
+            self._local.session = session
+            return previous
+
+        with self._lock:
+            previous = self._tasks.pop(task, None)
+
+        if session is not None:
+            self.set(session)
+
+        return previous
+
+    def remove(self):
+        """Close and forget the session of the current scope"""
+        task = _current_task() if self.scope == 'task' else None
+
+        if task is None:
+            session = getattr(self._local, 'session', None)
+            self._local.session = None
+        else:
+            with self._lock:
+                session = self._tasks.pop(task, None)
+
+        if session is not None:
+            session.close()
+
+    def _task_done(self, task):
+        with self._lock:
+            session = self._tasks.pop(task, None)
+
+        if session is not None:
+            session.close()
+
+
 class Databases(object):
     """Handler for multiple database connections.
 
@@ -74,6 +480,11 @@ class Databases(object):
 
         self.pool_size = 0
         self.pool_recycle = 300
+        self.title_cache_size = 100000
+        self.metadata_cache_dir = None
+        self.session_scope = None
+        self.defer_text = False
+        self.text_cache = None
 
     def __repr__(self):
         return '{0.__class__.__name__}({0._databases!r})'.format(self)
@@ -142,6 +553,76 @@ class Databases(object):
     def pool_recycle(self):
         del self._pool_recycle
 
+    @property
+    def title_cache_size(self):
+        return self._title_cache_size
+
+    @title_cache_size.setter
+    def title_cache_size(self, value):
+        self._title_cache_size = value
+
+    @title_cache_size.deleter
+    def title_cache_size(self):
+        del self._title_cache_size
+
+    @property
+    def metadata_cache_dir(self):
+        return self._metadata_cache_dir
+
+    @metadata_cache_dir.setter
+    def metadata_cache_dir(self, value):
+        self._metadata_cache_dir = value
+
+    @metadata_cache_dir.deleter
+    def metadata_cache_dir(self):
+        del self._metadata_cache_dir
+
+    @property
+    def session_scope(self):
+        return self._session_scope
+
+    @session_scope.setter
+    def session_scope(self, value):
+        self._session_scope = value
+
+    @session_scope.deleter
+    def session_scope(self):
+        del self._session_scope
+
+    @property
+    def defer_text(self):
+        """Load texts only when they are accessed (set before connecting)"""
+        return self._defer_text
+
+    @defer_text.setter
+    def defer_text(self, value):
+        self._defer_text = value
+
+    @defer_text.deleter
+    def defer_text(self):
+        del self._defer_text
+
+    @property
+    def text_cache(self):
+        """Local text cache shared by all databases (see cache.TextCache)"""
+        return self._text_cache
+
+    @text_cache.setter
+    def text_cache(self, value):
+        self._text_cache = value
+
+    @text_cache.deleter
+    def text_cache(self):
+        del self._text_cache
+
+    @property
+    def max_connections(self):
+        """Maximum number of connections opened by all databases"""
+        return engines.max_connections
+
+    @max_connections.setter
+    def max_connections(self, value):
+        engines.max_connections = value
 
     def _date_from_match(self, match):
         """Get a datetime object from a database match object
@@ -167,6 +648,11 @@ class Databases(object):
         new_db = cls(driver, user, password, host, name, language)
         new_db.pool_size = self.pool_size
         new_db.pool_recycle = self.pool_recycle
+        new_db.title_cache_size = self.title_cache_size
+        new_db.metadata_cache_dir = self.metadata_cache_dir
+        new_db.session_scope = self.session_scope
+        new_db.defer_text = self.defer_text
+        new_db.text_cache = self.text_cache
 
         return new_db
 
@@ -212,6 +698,16 @@ class Databases(object):
         :param database:    Database to add
         :type database:     mwdb.orm.database.Database
         """
+        old_db = self._databases.get(database.language)
+
+        # titles cached for a replaced database might refer to pages that
+        # changed in the new dump
+        if old_db is not None and old_db is not database:
+            _log.debug('{0.language}: Replace {0.name} with {1.name}'.format(
+                old_db, database))
+            old_db.title_cache.clear()
+            old_db.redirect_targets.clear()
+
         self._databases[database.language] = database
 
     def get_class(self, language, name):
@@ -297,38 +793,112 @@ class Database(object):
 
         self._session = None
         self._Session = None
+        self._ReadOnlySession = None
+        self._sessions = None
+        # sessions of checkout_session, they take precedence over all others
+        self._checkouts = SessionRegistry(self.new_session, 'task')
         self._engine = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
 
-        if self.vendor == 'postgresql':
-            self._admin_engine = create_engine(
-                '{0.vendor}+{0.driver}://{0.user}:{0.password}@{0.host}' \
-                '/postgres'.format(self))
-        elif self.vendor == 'mysql':
-            self._admin_engine = create_engine(
-                '{0.vendor}+{0.driver}://{0.user}:{0.password}@' \
-                '{0.host}'.format(self))
+        self.title_cache = cache.LRUCache()
+        # page id of redirect -> page id of final target (None if broken)
+        self.redirect_targets = {}
 
         self.pool_size = 0
         self.pool_recycle = 300
+        self.title_cache_size = 100000
+        self.metadata_cache_dir = None
+        self.session_scope = None
+        self.defer_text = False
+        self.text_cache = None
 
     # ----------
     # Properties
 
     @property
     def session(self):
-        if self.engine is None:
-            self.connect()
-            self.create_mappers()
+        """Session of this database.
+
+        If session_scope is None a single session is shared by all users of
+        this database. Set it to 'thread' or 'task' to get one session per
+        thread or asyncio task. Within checkout_session the checked out
+        session is returned.
+        """
+        self._ensure_connected()
+
+        session = self._checkouts.current()
+        if session is not None:
+            return session
+
+        sessions = self._sessions
+        if sessions is not None:
+            return sessions()
 
         if self._session is None:
             self._session = self._Session()
 
         return self._session
 
+    @property
+    def session_scope(self):
+        return self._session_scope
+
+    @session_scope.setter
+    def session_scope(self, value):
+        # sessions of a previous scope are left to their users
+        self._sessions = None
+        if value is not None:
+            self._sessions = SessionRegistry(self.new_session, value)
+        self._session_scope = value
+
+    @session_scope.deleter
+    def session_scope(self):
+        self._sessions = None
+        del self._session_scope
+
+    @property
+    def defer_text(self):
+        """Load texts only when they are accessed (set before connecting)"""
+        return self._defer_text
+
+    @defer_text.setter
+    def defer_text(self, value):
+        self._defer_text = value
+
+    @defer_text.deleter
+    def defer_text(self):
+        del self._defer_text
+
+    @property
+    def text_cache(self):
+        """Local cache of texts or None (see cache.TextCache)"""
+        return self._text_cache
+
+    @text_cache.setter
+    def text_cache(self, value):
+        self._text_cache = value
+
+    @text_cache.deleter
+    def text_cache(self):
+        del self._text_cache
+
     @property
     def engine(self):
         return self._engine
 
+    @property
+    def _admin_engine(self):
+        """Administrative engine shared by all databases on this host"""
+        if self.vendor == 'postgresql':
+            return engines.admin_engine(
+                '{0.vendor}+{0.driver}://{0.user}:{0.password}@{0.host}' \
+                '/postgres'.format(self))
+        elif self.vendor == 'mysql':
+            return engines.admin_engine(
+                '{0.vendor}+{0.driver}://{0.user}:{0.password}@' \
+                '{0.host}'.format(self))
+
     @property
     def table_names(self):
         return self._metadata.tables.keys()
@@ -405,6 +975,26 @@ class Database(object):
     def pool_recycle(self):
         del self._pool_recycle
 
+    @property
+    def title_cache_size(self):
+        return self.title_cache.max_size
+
+    @title_cache_size.setter
+    def title_cache_size(self, value):
+        self.title_cache.max_size = value
+
+    @property
+    def metadata_cache_dir(self):
+        return self._metadata_cache_dir
+
+    @metadata_cache_dir.setter
+    def metadata_cache_dir(self, value):
+        self._metadata_cache_dir = value
+
+    @metadata_cache_dir.deleter
+    def metadata_cache_dir(self):
+        del self._metadata_cache_dir
+
     @property
     def host(self):
         return self._host
@@ -444,10 +1034,70 @@ class Database(object):
     # -----------------------------------------
     # Common methods to all Database subclasses
 
+    def _ensure_connected(self):
+        """Connect and create the mappers on first use"""
+        if not self._connected:
+            with self._connect_lock:
+                if not self._connected:
+                    self.connect()
+                    self.create_mappers()
+                    self._connected = True
+
+    def new_session(self):
+        """Create a new session, which has to be closed by the caller"""
+        self._ensure_connected()
+        return self._Session()
+
+    @contextmanager
+    def checkout_session(self, session=None):
+        """Contextmanager for a private session.
+
+        Within the context the session is the session of the current thread
+        or task, so all lookups made there use it. The session used before is
+        restored and the private session is closed when the context is left,
+        so contexts can be nested.
+
+        :param session: Session to use instead of a new one. It is left open
+                        when the context is left.
+        :type session:  sqlalchemy.orm.session.Session
+        """
+        self.session
+
+        private = session is None
+        if private:
+            session = self._Session()
+
+        previous = self._checkouts.swap(session)
+
+        try:
+            yield session
+        finally:
+            self._checkouts.swap(previous)
+            if private:
+                session.close()
+
+    @contextmanager
+    def readonly_session(self):
+        """Contextmanager for a private read-only session.
+
+        The session never flushes and does not expire loaded objects. It is
+        meant for long scans that call expunge_all() after every batch to
+        keep the identity map small. The session is closed when the context
+        is left.
+        """
+        self.session
+
+        session = self._ReadOnlySession()
+
+        try:
+            yield session
+        finally:
+            session.close()
+
     def connect(self):
         """Connect to database and initialise session"""
         _log.debug('{0.name}: Connecting'.format(self))
-        self._engine = create_engine(
+        self._engine = engines.create_engine(
             '{0.vendor}+{0.driver}://{0.user}:{0.password}@{0.host}' \
             '/{0.name}'.format(self),
             echo=False,
@@ -458,22 +1108,119 @@ class Database(object):
 
         _log.debug('{0.name}: Create session and metadata'.format(self))
         self._Session = sessionmaker(bind=self.engine)
+        self._ReadOnlySession = sessionmaker(bind=self.engine,
+                                             autoflush=False,
+                                             expire_on_commit=False)
         self._metadata = MetaData(bind=self.engine)
         self.reflect()
 
     def create_mappers(self):
         """Create mappers for this database"""
         try:
-            self.classes = mapper.init_mappers(self._metadata, self.language)
+            self.classes = mapper.init_mappers(self._metadata, self.language,
+                                               self.defer_text)
         except KeyError as k_err:
             _log.error('Could not create mappers: {0}'.format(repr(k_err)))
 
     def reflect(self):
-        """Update database metadata"""
+        """Update database metadata
+
+        If metadata_cache_dir is set, the reflected metadata is cached on
+        disk together with a fingerprint of the schema and reused as long as
+        the fingerprint does not change.
+        """
+        fingerprint = None
+
+        if self.metadata_cache_dir is not None:
+            fingerprint = self._schema_fingerprint()
+
+            if fingerprint is not None and self._load_metadata(fingerprint):
+                return
+
         _log.debug('{0.name}: Reflecting tables'.format(self))
         self._metadata.clear()
         self._metadata.reflect()
 
+        if fingerprint is not None:
+            self._save_metadata(fingerprint)
+
+    def _schema_fingerprint(self):
+        """Get a cheap fingerprint of the database schema.
+
+        Databases that do not support fingerprints return None, which
+        disables the metadata cache.
+        """
+        return None
+
+    def _fingerprint_rows(self, rows):
+        """Hash rows of a catalog query"""
+        digest = hashlib.sha1()
+        for row in rows:
+            digest.update(repr(tuple(row)).encode('utf8'))
+        return digest.hexdigest()
+
+    def _metadata_cache_path(self):
+        """Path of the metadata cache file of this database.
+
+        Databases of the same name on different servers or seen by different
+        users get different files, the password is not part of the name.
+        """
+        location = '{0.vendor}+{0.driver}://{0.user}@{0.host}/' \
+                   '{0.name}'.format(self)
+        digest = hashlib.sha1(location.encode('utf8')).hexdigest()
+        return os.path.join(self.metadata_cache_dir,
+                            '{0}-{1}.metadata'.format(self.name, digest[:16]))
+
+    def _load_metadata(self, fingerprint):
+        """Load cached metadata if it matches the given fingerprint.
+
+        :return:    True if the cached metadata was loaded
+        :rtype:     bool
+        """
+        path = self._metadata_cache_path()
+
+        try:
+            with open(path, 'rb') as fp:
+                cached_fingerprint, metadata = pickle.load(fp)
+        except (IOError, OSError) as err:
+            _log.debug('{0.name}: No cached metadata: {1}'.format(self, err))
+            return False
+        except Exception as err:
+            # truncated files or caches written by other versions of Python
+            # or SQLAlchemy, the metadata is reflected again
+            _log.warning('{0.name}: Unusable cached metadata in {1}: '
+                         '{2!r}'.format(self, path, err))
+            return False
+
+        if cached_fingerprint != fingerprint:
+            _log.debug('{0.name}: Cached metadata is stale'.format(self))
+            return False
+
+        _log.debug('{0.name}: Load cached metadata'.format(self))
+        metadata.bind = self.engine
+        self._metadata = metadata
+        return True
+
+    def _save_metadata(self, fingerprint):
+        """Save metadata together with given fingerprint"""
+        path = self._metadata_cache_path()
+
+        try:
+            if not os.path.isdir(self.metadata_cache_dir):
+                os.makedirs(self.metadata_cache_dir)
+
+            # write to a temporary file first, other processes might read
+            # the cache file at the same time
+            fd, tmp_path = tempfile.mkstemp(dir=self.metadata_cache_dir)
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump((fingerprint, self._metadata), fp,
+                            pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, path)
+            _log.debug('{0.name}: Cached metadata in {1}'.format(self, path))
+        except (IOError, OSError, pickle.PicklingError) as err:
+            _log.warning('{0.name}: Could not cache metadata: {1}'.format(
+                self, err))
+
     def drop_table(self, table_name):
         """Drop table with given name
 
@@ -535,24 +1282,48 @@ class PostgreSQLDatabase(Database):
         """Contextmanager for admin sessions with transaction level set to
         AUTOCOMMIT.
         """
+        conn = self._admin_engine.connect()
+        old_isolation_level = conn.connection.isolation_level
         try:
-            conn = self._admin_engine.connect()
-            old_isolation_level = conn.connection.isolation_level
             conn.connection.set_isolation_level(
                 ISOLATION_LEVEL_AUTOCOMMIT)
             yield conn
         finally:
             conn.connection.set_isolation_level(old_isolation_level)
+            conn.close()
+
+    @contextmanager
+    def _autocommit_conn(self):
+        """Contextmanager for connections to this database with transaction
+        level set to AUTOCOMMIT.
+        """
+        conn = self._engine.connect()
+        old_isolation_level = conn.connection.isolation_level
+        try:
+            conn.connection.set_isolation_level(
+                ISOLATION_LEVEL_AUTOCOMMIT)
+            yield conn
+        finally:
+            conn.connection.set_isolation_level(old_isolation_level)
+            conn.close()
 
     @contextmanager
     def _admin_conn(self):
         """Contextmanager for admin engine connections.
         """
-        yield self._admin_engine.connect()
+        conn = self._admin_engine.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
 
     @contextmanager
     def _conn(self):
-        yield self._engine.connect()
+        conn = self._engine.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
 
     def _get_pkey_columns(self, table_name):
         """Get primary key column definition for given table"""
@@ -625,9 +1396,11 @@ class PostgreSQLDatabase(Database):
             # New index name will consist of the joined colum names:
             # tbl.newt_column, tbl.witch_column ->
             #   tbl_newt_column_tbl_witch_column
+            # Dictionary definitions are created as DDL statements
+            # (see _new_index_statements)
             return [
                 Index('_'.join(icols), *[tbl.c[icol] for icol in icols])
-                    for icols in index_defs]
+                    for icols in index_defs if not isinstance(icols, dict)]
         except KeyError as k_err:
             _log.error('{0.name}.{1}: Error in index definition: {2}'.format(
                 self, table_name, index_defs))
@@ -635,6 +1408,194 @@ class PostgreSQLDatabase(Database):
                 '{0.name}.{1}: Error in index definition: {2}'.format(
                     self, table_name, index_defs))
 
+    def _server_version(self):
+        """Version of the server as tuple of integers"""
+        self._ensure_connected()
+        return self._engine.dialect.server_version_info or ()
+
+    def _create_index_clause(self, name):
+        """Start of a CREATE INDEX statement that skips existing indexes"""
+        if self._server_version() < (9, 5):
+            return 'CREATE INDEX {0}'.format(name)
+        return 'CREATE INDEX IF NOT EXISTS {0}'.format(name)
+
+    def _new_index_statements(self, table_name):
+        """Create DDL statements for partial, expression and covering indexes
+
+        These indexes are defined with dictionaries in
+        tables.postgresql.indexed_columns. Included columns need PostgreSQL
+        11 and are left out on older servers.
+
+        :param table_name:  Name of the table for which to create indexes
+        :type table_name:   string
+
+        :return:            List of (index name, statement) tuples
+        :rtype:             list
+        """
+        statements = []
+        include = None
+
+        for index_def in postgresql_tables.indexed_columns.get(table_name, []):
+            if not isinstance(index_def, dict):
+                continue
+
+            try:
+                statement = '{0} ON "{1}"'.format(
+                    self._create_index_clause(index_def['name']), table_name)
+
+                if index_def.get('using'):
+                    statement += ' USING {0}'.format(index_def['using'])
+
+                statement += ' ({0})'.format(', '.join(index_def['columns']))
+
+                if index_def.get('include'):
+                    if include is None:
+                        include = self._server_version() >= (11, )
+
+                    if include:
+                        statement += ' INCLUDE ({0})'.format(
+                            ', '.join(index_def['include']))
+                    else:
+                        _log.warning('{0.name}.{1}: {2}: INCLUDE needs '
+                                     'PostgreSQL 11'.format(
+                                         self, table_name, index_def['name']))
+
+                if index_def.get('where'):
+                    statement += ' WHERE {0}'.format(index_def['where'])
+            except KeyError as k_err:
+                _log.error('{0.name}.{1}: Error in index definition: '
+                           '{2}'.format(self, table_name, index_def))
+                raise exceptions.IndexError(
+                    '{0.name}.{1}: Error in index definition: {2}'.format(
+                        self, table_name, index_def))
+
+            statements.append((index_def['name'], statement))
+
+        return statements
+
+    def _new_search_index_statements(self, table_name, trigram=True):
+        """Create DDL statements for search indexes of given table.
+
+        B-tree indexes cannot serve LIKE patterns with a leading wildcard,
+        substring searches are served by a trigram GIN index instead. Suffix
+        searches use an expression index from indexed_columns. Existing
+        indexes are left alone from PostgreSQL 9.5 on, so the statements can
+        be run again.
+
+        :param table_name:  Name of the table for which to create indexes
+        :type table_name:   string
+
+        :param trigram:     Create trigram indexes
+        :type trigram:      bool
+
+        :return:            List of (index name, statement) tuples
+        :rtype:             list
+        """
+        statements = []
+
+        if trigram:
+            for column in postgresql_tables.trigram_indexed_columns.get(
+                table_name, []):
+                name = '{0}_trgm'.format(column)
+                statements.append((
+                    name,
+                    '{0} ON "{1}" USING gin ({2} gin_trgm_ops)'.format(
+                        self._create_index_clause(name), table_name,
+                        column)))
+
+        return statements
+
+    def _pkey_statement(self, table_name):
+        """Create DDL statement for the primary key of given table.
+
+        :return:    (constraint name, statement) tuple or None
+        """
+        pk_cols = self._get_pkey_columns(table_name)
+
+        if pk_cols is None:
+            return None
+
+        return ('{0}_pkey'.format(table_name),
+                'ALTER TABLE "{0}" ADD CONSTRAINT {0}_pkey '
+                'PRIMARY KEY ({1})'.format(table_name, ', '.join(pk_cols)))
+
+    def _index_statements(self, table_name, trigram=True,
+                          concurrently=False):
+        """Create DDL statements for all indexes of given table.
+
+        :param concurrently:    Build the indexes without locking out writes
+        :type concurrently:     bool
+
+        :return:                List of (index name, statement) tuples
+        :rtype:                 list
+        """
+        statements = [(idx.name,
+                       'CREATE INDEX {0} ON "{1}" ({2})'.format(
+                           idx.name, table_name,
+                           ', '.join(col.name for col in idx.columns)))
+                      for idx in self._new_indexes(table_name)]
+        statements.extend(self._new_index_statements(table_name))
+        statements.extend(self._new_search_index_statements(table_name,
+                                                            trigram))
+
+        if concurrently:
+            statements = [
+                (name, statement.replace('CREATE INDEX ',
+                                         'CREATE INDEX CONCURRENTLY ', 1))
+                for name, statement in statements]
+
+        return statements
+
+    def _existing_indexes(self, table_name):
+        """Get the indexes of given table.
+
+        :return:    Dictionary mapping index names to True for valid indexes
+                    and False for indexes left behind by failed concurrent
+                    builds
+        :rtype:     dict
+        """
+        return dict(self._engine.execute(
+            "SELECT c.relname, i.indisvalid "
+            "FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            "JOIN pg_namespace n ON n.oid = t.relnamespace "
+            "WHERE n.nspname = 'public' AND t.relname = %(table)s",
+            {'table': table_name}).fetchall())
+
+    def _table_size(self, table_name):
+        """Size of given table in bytes"""
+        return self._engine.execute(
+            'SELECT pg_relation_size(%(table)s)',
+            {'table': '"{0}"'.format(table_name)}).scalar()
+
+    def _enable_trigram(self):
+        """Enable the pg_trgm extension in this database.
+
+        :return:    True if the extension is available
+        :rtype:     bool
+        """
+        try:
+            self._engine.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            return True
+        except sa_exc.DBAPIError as db_err:
+            _log.warning('{0.name}: pg_trgm not available: {1}'.format(
+                self, db_err))
+            return False
+
+    def _schema_fingerprint(self):
+        """Fingerprint of all tables and indexes in the public schema.
+
+        Oids change when relations are created, relfilenodes when tables are
+        rewritten and relnatts when columns are added or dropped.
+        """
+        return self._fingerprint_rows(self._engine.execute(
+            "SELECT c.relname, c.oid, c.relfilenode, c.relnatts "
+            "FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = 'public' AND c.relkind IN ('r', 'i') "
+            "ORDER BY c.relname"))
+
     def all_databases(self):
         """Get a list of all databases on this DBs host"""
         _log.debug('{0.host}: List all databases'.format(self))
@@ -737,19 +1698,23 @@ class PostgreSQLDatabase(Database):
     # -----------------
     # Table constraints
 
-    def create_pkey_constraint(self, table_name):
+    def create_pkey_constraint(self, table_name, bind=None):
         """Create primary key constraint for given table
 
         :param table_name:  Name of the table for which a pkey constraint
                             should be created.
         :type table_name:   string
+
+        :param bind:        Connection to use instead of the engine
+        :type bind:         sqlalchemy.engine.Connection
         """
         pkey = self._new_pkey_constraint(table_name)
+        bind = bind or self._engine
 
         if pkey is not None:
             _log.debug('{0.name}.{1}: Add pkey constraint: {2}'.format(
                 self, table_name, pkey.name))
-            self._engine.execute(AddConstraint(pkey))
+            bind.execute(AddConstraint(pkey))
         else:
             _log.debug('{0.name}.{1}: No pkey defined'.format(
                 self, table_name))
@@ -779,16 +1744,39 @@ class PostgreSQLDatabase(Database):
     # -------
     # Indexes
 
-    def create_indexes(self, table_name):
+    def create_indexes(self, table_name, trigram=True, bind=None):
         """Add indexes for given table
 
         :param table_name:  Name of the table for which to create indexes
         :type table_name:   string
+
+        :param trigram:     Create trigram indexes for substring searches.
+                            They are skipped if pg_trgm is not available.
+        :type trigram:      bool
+
+        :param bind:        Connection to use instead of the engine
+        :type bind:         sqlalchemy.engine.Connection
         """
+        bind = bind or self._engine
+
         for idx in self._new_indexes(table_name):
             _log.debug('{0.name}.{1}: Creating index: {2.name}'.format(
                 self, table_name, idx))
-            idx.create(bind=self._engine)
+            idx.create(bind=bind)
+
+        for name, statement in self._new_index_statements(table_name):
+            _log.debug('{0.name}.{1}: Creating index: {2}'.format(
+                self, table_name, name))
+            bind.execute(statement)
+
+        if trigram and table_name in postgresql_tables.trigram_indexed_columns:
+            trigram = self._enable_trigram()
+
+        for name, statement in self._new_search_index_statements(table_name,
+                                                                 trigram):
+            _log.debug('{0.name}.{1}: Creating index: {2}'.format(
+                self, table_name, name))
+            bind.execute(statement)
 
     def drop_indexes(self, table_name):
         """Drop indexes on given table.
@@ -804,6 +1792,108 @@ class PostgreSQLDatabase(Database):
             _log.debug('{0.name}.{1}: Dropping index: {2.name}'.format(
                 self, table_name, idx))
             idx.drop()
+
+        # partial and expression indexes are not reflected
+        for name, statement in (self._new_index_statements(table_name) +
+                                self._new_search_index_statements(table_name)):
+            _log.debug('{0.name}.{1}: Dropping index: {2}'.format(
+                self, table_name, name))
+            self._engine.execute('DROP INDEX IF EXISTS {0}'.format(name))
+
+        self.reflect()
+
+    # ---------
+    # Bulk load
+
+    @contextmanager
+    def bulk_load(self, tables, unlogged=False, maintenance_work_mem=None):
+        """Contextmanager for loading large amounts of data into tables.
+
+        On entry the primary keys and indexes of the tables are dropped, so
+        loaded rows do not pay for index maintenance. On exit the tables are
+        switched back to logged, the primary keys and indexes defined in
+        tables.postgresql are built and the tables are analyzed.
+
+        If the load raises, nothing is rebuilt and the error is passed on.
+        The tables are left without primary keys and indexes, which can be
+        built with indexer.build_indexes once the data is fixed.
+
+        The context yields a dictionary that maps the phases (drop, load,
+        logged, pkey, indexes, analyze) to the seconds they took.
+
+        :param tables:                  Names of the tables that are loaded
+        :type tables:                   sequence
+
+        :param unlogged:                Make the tables UNLOGGED during the
+                                        load. Their contents are lost if the
+                                        server crashes before the end of the
+                                        context. Needs PostgreSQL 9.5.
+        :type unlogged:                 bool
+
+        :param maintenance_work_mem:    Memory for building the indexes,
+                                        e.g. '2GB'
+        :type maintenance_work_mem:     string
+        """
+        timings = {}
+
+        def timed(phase, func, *args):
+            start = time.time()
+            func(*args)
+            timings[phase] = timings.get(phase, 0.0) + time.time() - start
+            _log.info('{0.name}: Bulk load: {1} took {2:.1f}s'.format(
+                self, phase, timings[phase]))
+
+        def drop(table_name):
+            self.drop_pkey_constraint(table_name)
+            self.drop_indexes(table_name)
+            if unlogged:
+                self._engine.execute(
+                    'ALTER TABLE "{0}" SET UNLOGGED'.format(table_name))
+
+        def set_logged(conn):
+            for table_name in tables:
+                conn.execute('ALTER TABLE "{0}" SET LOGGED'.format(
+                    table_name))
+
+        def create_pkeys(conn):
+            for table_name in tables:
+                self.create_pkey_constraint(table_name, bind=conn)
+
+        def create_indexes(conn):
+            for table_name in tables:
+                self.create_indexes(table_name, bind=conn)
+
+        def analyze(conn):
+            for table_name in tables:
+                conn.execute('ANALYZE "{0}"'.format(table_name))
+            conn.execute('COMMIT')
+
+        for table_name in tables:
+            timed('drop', drop, table_name)
+
+        start = time.time()
+        try:
+            yield timings
+        except:
+            _log.error('{0.name}: Bulk load failed, primary keys and indexes '
+                       'are not rebuilt'.format(self))
+            raise
+
+        timings['load'] = time.time() - start
+        _log.info('{0.name}: Bulk load: load took {1:.1f}s'.format(
+            self, timings['load']))
+
+        with self._conn() as conn:
+            if maintenance_work_mem is not None:
+                conn.execute("SET maintenance_work_mem = '{0}'".format(
+                    maintenance_work_mem))
+
+            if unlogged:
+                timed('logged', set_logged, conn)
+            timed('pkey', create_pkeys, conn)
+            timed('indexes', create_indexes, conn)
+            timed('analyze', analyze, conn)
+
         self.reflect()
 
 
@@ -818,12 +1908,37 @@ class MySQLDatabase(Database):
     def __repr__(self):
         return 'MySQLDatabase({0.host}, {0.name})'.format(self)
 
+    def _schema_fingerprint(self):
+        """Fingerprint of all tables, columns and indexes in this database.
+
+        In-place ALTER TABLE keeps the creation time of a table, so the
+        definitions of the columns and indexes are part of the fingerprint.
+        """
+        return self._fingerprint_rows(itertools.chain(
+            self._engine.execute(
+                "SELECT table_name, create_time "
+                "FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() "
+                "ORDER BY table_name"),
+            self._engine.execute(
+                "SELECT table_name, column_name, ordinal_position, "
+                "column_type, is_nullable, column_default "
+                "FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() "
+                "ORDER BY table_name, ordinal_position"),
+            self._engine.execute(
+                "SELECT table_name, index_name, seq_in_index, column_name, "
+                "non_unique, sub_part "
+                "FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() "
+                "ORDER BY table_name, index_name, seq_in_index")))
+
     def all_databases(self):
         """Get a list of all databases on this DBs host"""
 
         _log.debug('{0.host}: List all databases'.format(self))
 
-        return (d[0] for d in self.admin_session.execute(
+        return (d[0] for d in self._admin_engine.execute(
             'SHOW DATABASES;').fetchall())
 
     # -----------------------
@@ -832,12 +1947,12 @@ class MySQLDatabase(Database):
     def create(self):
         """Create this database"""
         _log.debug('{0.name}: Create'.format(self))
-        self.admin_session.execute('CREATE DATABASE {0.name}'.format(self))
+        self._admin_engine.execute('CREATE DATABASE {0.name}'.format(self))
 
     def drop(self):
         """Drop this database"""
         _log.debug('{0.name}: Drop'.format(self))
-        self.admin_session.execute('DROP DATABASE {0.name}'.format(self))
+        self._admin_engine.execute('DROP DATABASE {0.name}'.format(self))
 
     # -------
     # Indexes
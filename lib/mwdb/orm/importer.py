@@ -0,0 +1,622 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""Import of Wikipedia dumps into PostgreSQL databases with COPY.
+
+SQL dumps (*.sql.gz) and XML dumps (pages-articles.xml.bz2) are decompressed
+and parsed in parser processes, which translate the rows into batches in the
+text format of COPY. Writer processes stream these batches into the tables
+with COPY ... FROM STDIN, each on its own connection.
+
+The tables have to exist. Run large imports within
+PostgreSQLDatabase.bulk_load, which drops primary keys and indexes and
+rebuilds them afterwards.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bz2
+import gzip
+import io
+import logging
+import multiprocessing
+import os
+import random
+import re
+
+try:
+    import xml.etree.cElementTree as etree
+except ImportError as imp_err:
+    import xml.etree.ElementTree as etree
+
+try:
+    from Queue import Empty, Full
+except ImportError as imp_err:
+    from queue import Empty, Full
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.types import TIMESTAMP
+
+from .. import exceptions
+from ..mediawiki import text as mw_text
+from .tables import postgresql as postgresql_tables
+
+_log = logging.getLogger(__name__)
+
+# tables filled by default
+default_tables = ('page', 'pagelinks', 'categorylinks', 'langlinks',
+                  'redirect', 'revision', 'text')
+
+# tables filled from XML dumps
+xml_tables = ('page', 'revision', 'text')
+
+# number of rows sent to a writer at once
+batch_rows = 10000
+
+# seconds between two checks whether the writer processes are still alive
+poll_interval = 5
+
+# table name in SQL dump file names, e.g. enwiki-20100130-pagelinks.sql.gz
+_sql_dump_re = re.compile(r'-(?P<table>\w+)\.sql(\.gz)?$')
+
+_create_table_re = re.compile(r'^CREATE TABLE `(?P<table>\w+)`')
+_column_re = re.compile(r'^\s+`(?P<column>\w+)`')
+_insert_re = re.compile(r'^INSERT INTO `(?P<table>\w+)` VALUES ')
+
+# tokens of the VALUES list of an INSERT statement
+_sql_token_re = re.compile(
+    r"'((?:[^'\\]|\\.)*)'|(NULL)|([^,()'\s;]+)|([(),;])", re.S)
+
+_sql_escape_re = re.compile(r'\\(.)', re.S)
+
+# PostgreSQL text cannot contain NUL characters, they are dropped
+_sql_escapes = {'0': '', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t',
+                'Z': '\x1a'}
+
+_mediawiki_timestamp_re = re.compile(r'^\d{14}$')
+
+# state of parser processes, set by _init_parser
+_queue = None
+_options = None
+
+
+def _open_dump(path):
+    """Open a dump file and decompress it on the fly"""
+    if path.endswith('.bz2'):
+        return bz2.BZ2File(path)
+    elif path.endswith('.gz'):
+        return gzip.open(path)
+    return io.open(path, 'rb')
+
+
+def _copy_field(value):
+    """Format value for the text format of COPY"""
+    if value is None:
+        return '\\N'
+
+    if not isinstance(value, unicode):
+        value = unicode(value)
+
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _unescape(value):
+    """Unescape a MySQL string literal"""
+    return _sql_escape_re.sub(
+        lambda match: _sql_escapes.get(match.group(1), match.group(1)), value)
+
+
+def _timestamp(value):
+    """Convert a MediaWiki timestamp (YYYYMMDDHHMMSS) for PostgreSQL"""
+    if value is None or not _mediawiki_timestamp_re.match(value):
+        return value
+    return '{0}-{1}-{2} {3}:{4}:{5}+00'.format(
+        value[0:4], value[4:6], value[6:8], value[8:10], value[10:12],
+        value[12:14])
+
+
+def _table_columns(table_name):
+    """Column names of a table and the names of its timestamp columns"""
+    table = postgresql_tables.metadata.tables[table_name]
+    return ([column.name for column in table.columns],
+            set(column.name for column in table.columns
+                if isinstance(column.type, TIMESTAMP)))
+
+
+def _iter_sql_rows(line, start):
+    """Rows in the VALUES list of an INSERT statement"""
+    row = None
+
+    for match in _sql_token_re.finditer(line, start):
+        string, null, number, punct = match.groups()
+
+        if string is not None:
+            if row is not None:
+                row.append(_unescape(string))
+        elif null is not None:
+            if row is not None:
+                row.append(None)
+        elif number is not None:
+            if row is not None:
+                row.append(number)
+        elif punct == '(':
+            row = []
+        elif punct == ')':
+            yield row
+            row = None
+
+
+class _Batches(object):
+    """Rows of the tables of a dump collected into COPY batches"""
+
+    def __init__(self, queue, size):
+        self._queue = queue
+        self._size = size
+        self._lines = {}
+        self._columns = {}
+        self.counts = {}
+
+    def add(self, table, columns, values):
+        """Add a row of values for given columns"""
+        lines = self._lines.setdefault(table, [])
+        self._columns[table] = columns
+        lines.append('\t'.join(_copy_field(value) for value in values))
+
+        if len(lines) >= self._size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        """Send the collected rows of a table or all tables to the writers"""
+        for name in ([table] if table is not None else list(self._lines)):
+            lines = self._lines.pop(name, None)
+
+            if not lines:
+                continue
+
+            data = ('\n'.join(lines) + '\n').encode('utf8')
+            self._queue.put((name, tuple(self._columns[name]), data,
+                             len(lines)))
+            self.counts[name] = self.counts.get(name, 0) + len(lines)
+
+
+def _parse_sql_dump(fp, tables, batches):
+    """Parse a MediaWiki SQL dump.
+
+    Dump columns are matched with the columns of the tables by the names in
+    the CREATE TABLE statement of the dump, so dumps of other MediaWiki
+    versions can be read as well.
+    """
+    dump_columns = {}
+    creating = None
+    mappings = {}
+
+    for line in fp:
+        line = line.decode('utf8', 'replace')
+
+        if creating is not None:
+            match = _column_re.match(line)
+            if match:
+                dump_columns[creating].append(match.group('column'))
+            elif line.startswith(')'):
+                creating = None
+            continue
+
+        match = _create_table_re.match(line)
+        if match:
+            creating = match.group('table')
+            dump_columns[creating] = []
+            continue
+
+        match = _insert_re.match(line)
+        if not match or match.group('table') not in tables:
+            continue
+
+        table = match.group('table')
+
+        if table not in mappings:
+            columns, timestamps = _table_columns(table)
+            names = dump_columns.get(table) or columns
+            columns = [column for column in columns if column in names]
+            mappings[table] = (columns,
+                               [names.index(column) for column in columns],
+                               [column in timestamps for column in columns])
+
+        columns, positions, timestamps = mappings[table]
+
+        for row in _iter_sql_rows(line, match.end()):
+            values = [row[pos] if pos < len(row) else None
+                      for pos in positions]
+            values = [_timestamp(value) if is_timestamp else value
+                      for value, is_timestamp in zip(values, timestamps)]
+            batches.add(table, columns, values)
+
+
+def _local_name(tag):
+    """Tag name without XML namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child_text(elem, name, default=None):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return child.text if child.text is not None else ''
+    return default
+
+
+def _iter_xml_pages(fp):
+    """Pages of an XML dump as (page element, namespaces) tuples.
+
+    namespaces maps namespace names to numbers. Elements are freed after
+    they have been processed.
+    """
+    namespaces = {}
+    root = None
+
+    for event, elem in etree.iterparse(fp, events=('start', 'end')):
+        if root is None:
+            root = elem
+
+        if event != 'end':
+            continue
+
+        name = _local_name(elem.tag)
+
+        if name == 'namespace':
+            if elem.text:
+                namespaces[elem.text] = int(elem.get('key'))
+        elif name == 'page':
+            yield elem, namespaces
+            root.clear()
+
+
+def _parse_xml_dump(fp, tables, batches, compress_text):
+    """Parse a MediaWiki XML dump (latest revision of every page)"""
+    page_columns = _table_columns('page')[0]
+    revision_columns = _table_columns('revision')[0]
+
+    for page, namespaces in _iter_xml_pages(fp):
+        title = _child_text(page, 'title', '')
+        namespace = _child_text(page, 'ns')
+
+        prefix, sep, rest = title.partition(':')
+        if namespace is None:
+            namespace = namespaces.get(prefix, 0) if sep else 0
+        namespace = int(namespace)
+        if namespace != 0 and sep:
+            title = rest
+        title = title.replace(' ', '_')
+
+        revision = None
+        for child in page:
+            if _local_name(child.tag) == 'revision':
+                revision = child
+
+        if revision is None:
+            continue
+
+        page_id = int(_child_text(page, 'id'))
+        rev_id = int(_child_text(revision, 'id'))
+        timestamp = _child_text(revision, 'timestamp')
+        page_text = _child_text(revision, 'text', '')
+        length = len(page_text.encode('utf8'))
+
+        user, user_id = '', 0
+        for child in revision:
+            if _local_name(child.tag) == 'contributor':
+                user = (_child_text(child, 'username') or
+                        _child_text(child, 'ip') or '')
+                user_id = int(_child_text(child, 'id') or 0)
+
+        if 'page' in tables:
+            values = {'page_id': page_id,
+                      'page_namespace': namespace,
+                      'page_title': title,
+                      'page_restrictions': _child_text(page, 'restrictions',
+                                                       ''),
+                      'page_counter': 0,
+                      'page_is_redirect': int(
+                          _child_text(page, 'redirect') is not None),
+                      'page_is_new': 0,
+                      'page_random': random.random(),
+                      'page_touched': timestamp,
+                      'page_latest': rev_id,
+                      'page_len': length}
+            batches.add('page', page_columns,
+                        [values[column] for column in page_columns])
+
+        if 'revision' in tables:
+            values = {'rev_id': rev_id,
+                      'rev_page': page_id,
+                      'rev_text_id': rev_id,
+                      'rev_comment': _child_text(revision, 'comment', ''),
+                      'rev_user': user_id,
+                      'rev_user_text': user,
+                      'rev_timestamp': timestamp,
+                      'rev_minor_edit': int(
+                          _child_text(revision, 'minor') is not None),
+                      'rev_deleted': 0,
+                      'rev_len': length,
+                      'rev_parent_id': _child_text(revision, 'parentid')}
+            batches.add('revision', revision_columns,
+                        [values[column] for column in revision_columns])
+
+        if 'text' in tables:
+            data, flags = mw_text.encode_text(page_text, compress_text)
+            batches.add('text', ('old_id', 'old_text', 'old_flags'),
+                        (rev_id, data, flags))
+
+
+def _init_parser(queue, options):
+    """Initialise a parser process"""
+    global _queue, _options
+    _queue = queue
+    _options = options
+
+
+def _parse_dump(task):
+    """Parse a dump and send its rows to the writers.
+
+    :return:    (path, row counts, error message) tuple
+    """
+    path, tables = task
+    batches = _Batches(_queue, _options['batch_rows'])
+
+    try:
+        _log.debug('Parse {0}'.format(path))
+        fp = _open_dump(path)
+        try:
+            if '.xml' in os.path.basename(path):
+                _parse_xml_dump(fp, tables, batches,
+                                _options['compress_text'])
+            else:
+                _parse_sql_dump(fp, tables, batches)
+        finally:
+            fp.close()
+
+        batches.flush()
+        return path, batches.counts, None
+    except Exception as err:
+        _log.error('Parsing {0} failed: {1}'.format(path, err))
+        batches.flush()
+        return path, batches.counts, '{0}: {1}: {2}'.format(
+            path, err.__class__.__name__, err)
+
+
+def _write_batches(queue, results, url, db_name):
+    """Writer process: COPY batches from queue until None arrives.
+
+    Failed batches are reported, the writer goes on with the next batch so
+    that the parsers never block on a full queue. The counts and errors of
+    the writer are always reported, even if it could not connect.
+    """
+    counts = {}
+    errors = []
+    engine = None
+    conn = None
+
+    try:
+        engine = create_engine(url, poolclass=NullPool)
+        conn = engine.raw_connection()
+
+        while True:
+            item = queue.get()
+
+            if item is None:
+                break
+
+            table, columns, data, rows = item
+
+            try:
+                cursor = conn.cursor()
+                cursor.copy_expert('COPY {0} ({1}) FROM STDIN'.format(
+                    table, ', '.join(columns)), io.BytesIO(data))
+                conn.commit()
+                counts[table] = counts.get(table, 0) + rows
+            except Exception as err:
+                conn.rollback()
+                _log.error('{0}.{1}: COPY failed: {2}'.format(
+                    db_name, table, err))
+                errors.append('{0}: {1}: {2}'.format(
+                    table, err.__class__.__name__, err))
+    except Exception as err:
+        _log.error('{0}: Writer failed: {1}'.format(db_name, err))
+        errors.append('writer: {0}: {1}'.format(err.__class__.__name__, err))
+    finally:
+        if conn is not None:
+            conn.close()
+        if engine is not None:
+            engine.dispose()
+        results.put((counts, errors))
+
+
+def dump_tasks(paths, tables=default_tables):
+    """Assign the requested tables to dump files.
+
+    SQL dumps are recognised by the table name in the file name. XML dumps
+    fill the page table only if no SQL dump of the page table is given.
+
+    :return:    List of (path, tables) tuples
+    """
+    sql_tables = {}
+    xml_paths = []
+
+    for path in paths:
+        match = _sql_dump_re.search(os.path.basename(path))
+        if match and match.group('table') in tables:
+            sql_tables[path] = match.group('table')
+        elif '.xml' in os.path.basename(path):
+            xml_paths.append(path)
+        else:
+            _log.warning('Skip dump: {0}'.format(path))
+
+    tasks = [(path, (table, )) for path, table in sql_tables.items()]
+
+    for path in xml_paths:
+        wanted = tuple(table for table in xml_tables if table in tables and
+                       table not in sql_tables.values())
+        if wanted:
+            tasks.append((path, wanted))
+
+    return tasks
+
+
+def import_dumps(lang_db, paths, tables=default_tables, parsers=None,
+                 writers=None, compress_text=False, queue_size=None):
+    """Import Wikipedia dumps into a PostgreSQL language database.
+
+    :param lang_db:         Target database
+    :type lang_db:          mwdb.orm.database.PostgreSQLDatabase
+
+    :param paths:           Paths of SQL and XML dump files
+    :type paths:            sequence
+
+    :param tables:          Tables that will be filled
+    :type tables:           sequence
+
+    :param parsers:         Number of parser processes. Defaults to the
+                            number of dump files, at most the number of CPUs.
+    :type parsers:          int
+
+    :param writers:         Number of writer processes (and connections)
+    :type writers:          int
+
+    :param compress_text:   Store texts compressed (see text.encode_text)
+    :type compress_text:    bool
+
+    :param queue_size:      Maximum number of batches waiting for a writer
+    :type queue_size:       int
+
+    :return:                Dictionary mapping tables to the number of
+                            imported rows
+    :rtype:                 dict
+
+    :raises DumpImportError:    If dumps could not be parsed or batches could
+                                not be written
+    """
+    if lang_db.vendor != 'postgresql':
+        raise ValueError('{0.name}: COPY import needs PostgreSQL'.format(
+            lang_db))
+
+    tasks = dump_tasks(paths, tables)
+
+    if parsers is None:
+        parsers = max(1, min(len(tasks), multiprocessing.cpu_count()))
+    if writers is None:
+        writers = max(1, multiprocessing.cpu_count() // 2)
+    if queue_size is None:
+        queue_size = 4 * writers
+
+    _log.debug('{0.name}: Import {1} dumps with {2} parsers and {3} '
+               'writers'.format(lang_db, len(tasks), parsers, writers))
+
+    queue = multiprocessing.Queue(queue_size)
+    results = multiprocessing.Queue()
+    url = '{0.vendor}+{0.driver}://{0.user}:{0.password}@{0.host}' \
+          '/{0.name}'.format(lang_db)
+
+    writer_procs = [multiprocessing.Process(
+                        target=_write_batches,
+                        args=(queue, results, url, lang_db.name))
+                    for i in range(writers)]
+    for proc in writer_procs:
+        proc.start()
+
+    pool = multiprocessing.Pool(parsers, _init_parser,
+                                (queue, {'batch_rows': batch_rows,
+                                         'compress_text': compress_text}))
+    errors = []
+    parsed = {}
+
+    try:
+        parsed_dumps = pool.imap_unordered(_parse_dump, tasks)
+
+        while True:
+            try:
+                path, counts, message = parsed_dumps.next(poll_interval)
+            except StopIteration:
+                break
+            except multiprocessing.TimeoutError:
+                # parsers block on the full queue if no writer is left
+                if not any(proc.is_alive() for proc in writer_procs):
+                    raise exceptions.DumpImportError(
+                        '{0.name}: All writers exited'.format(lang_db),
+                        errors, {})
+                continue
+
+            _log.debug('Parsed {0}: {1}'.format(path, counts))
+            if message is not None:
+                errors.append(message)
+            for table, rows in counts.items():
+                parsed[table] = parsed.get(table, 0) + rows
+        pool.close()
+    except:
+        pool.terminate()
+        for proc in writer_procs:
+            proc.terminate()
+        raise
+    finally:
+        pool.join()
+
+    for i in range(len(writer_procs)):
+        while True:
+            try:
+                queue.put(None, True, poll_interval)
+                break
+            except Full:
+                if not any(proc.is_alive() for proc in writer_procs):
+                    break
+
+    written = {}
+    reported = 0
+    exited = 0
+
+    while reported < len(writer_procs):
+        try:
+            counts, writer_errors = results.get(True, poll_interval)
+        except Empty:
+            if any(proc.is_alive() for proc in writer_procs):
+                continue
+
+            # results of writers that just exited may still be in transit
+            exited += 1
+            if exited < 2:
+                continue
+
+            errors.append('{0} writers exited without a result'.format(
+                len(writer_procs) - reported))
+            break
+
+        reported += 1
+        errors.extend(writer_errors)
+        for table, rows in counts.items():
+            written[table] = written.get(table, 0) + rows
+
+    for proc in writer_procs:
+        proc.join()
+
+    if errors:
+        raise exceptions.DumpImportError(
+            '{0.name}: {1} errors during import'.format(lang_db, len(errors)),
+            errors, written)
+
+    _log.debug('{0.name}: Imported {1}'.format(lang_db, written))
+    return written
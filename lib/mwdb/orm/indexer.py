@@ -0,0 +1,274 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""Parallel creation of primary keys and indexes.
+
+Primary keys and indexes of the tables of all PostgreSQL databases in a
+registry are built on a bounded number of connections, biggest tables first.
+The primary key of a table is built before its indexes, because adding it
+locks the table.
+
+Indexes that already exist are skipped, so an interrupted run can simply be
+started again. Invalid indexes left behind by failed concurrent builds are
+dropped and built again.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import heapq
+import logging
+import threading
+import time
+
+from .tables import postgresql as postgresql_tables
+
+_log = logging.getLogger(__name__)
+
+
+class IndexJob(object):
+    """A primary key or index of a table.
+
+    :ivar database:     Database of the table
+    :ivar table:        Table name
+    :ivar kind:         'pkey' or 'index'
+    :ivar name:         Name of the constraint or index
+    :ivar statement:    DDL statement that builds it
+    :ivar size:         Size of the table in bytes
+    :ivar drop_first:   Drop an invalid index of the same name first
+    """
+
+    def __init__(self, database, table, kind, name, statement, size,
+                 drop_first=False):
+        self.database = database
+        self.table = table
+        self.kind = kind
+        self.name = name
+        self.statement = statement
+        self.size = size
+        self.drop_first = drop_first
+
+    def __repr__(self):
+        return '{0.__class__.__name__}({0.database.name}.{0.table}, ' \
+               '{0.name})'.format(self)
+
+    def run(self):
+        """Build the primary key or index"""
+        with self.database._autocommit_conn() as conn:
+            if self.drop_first:
+                conn.execute('DROP INDEX IF EXISTS {0}'.format(self.name))
+            conn.execute(self.statement)
+
+
+def collect_jobs(databases, tables=None, concurrently=False, trigram=True):
+    """Collect the missing primary keys and indexes of all databases.
+
+    :param databases:       Registry of the databases
+    :type databases:        mwdb.orm.database.Databases
+
+    :param tables:          Names of the tables. Defaults to all tables with
+                            index definitions.
+    :type tables:           sequence
+
+    :param concurrently:    Use CREATE INDEX CONCURRENTLY
+    :type concurrently:     bool
+
+    :param trigram:         Build trigram indexes. The pg_trgm extension is
+                            only enabled in databases that miss a trigram
+                            index.
+    :type trigram:          bool
+
+    :return:                (jobs, number of existing indexes) tuple
+    """
+    jobs = []
+    existing = 0
+
+    for language in sorted(databases.languages):
+        lang_db = databases.get_database(language)
+
+        if lang_db.vendor != 'postgresql':
+            _log.warning('{0.name}: Skip {0.vendor} database'.format(lang_db))
+            continue
+
+        # connect and reflect
+        lang_db.session
+
+        trigram_jobs = []
+
+        names = tables
+        if names is None:
+            names = set(postgresql_tables.pkey_columns) | set(
+                postgresql_tables.indexed_columns)
+
+        for table in sorted(names):
+            if table not in lang_db.table_names:
+                continue
+
+            indexes = lang_db._existing_indexes(table)
+            size = lang_db._table_size(table)
+
+            statements = []
+            pkey = lang_db._pkey_statement(table)
+            if pkey is not None:
+                statements.append(('pkey', ) + pkey)
+            statements.extend(('index', name, statement) for name, statement
+                              in lang_db._index_statements(
+                                  table, trigram, concurrently))
+
+            trigram_names = set(name for name, statement in
+                                lang_db._new_search_index_statements(table))
+            trigram_names.difference_update(
+                name for name, statement in
+                lang_db._new_search_index_statements(table, trigram=False))
+
+            for kind, name, statement in statements:
+                if indexes.get(name):
+                    existing += 1
+                    continue
+
+                job = IndexJob(lang_db, table, kind, name, statement, size,
+                               drop_first=name in indexes)
+                if name in trigram_names:
+                    trigram_jobs.append(job)
+                else:
+                    jobs.append(job)
+
+        if trigram_jobs:
+            if lang_db._enable_trigram():
+                jobs.extend(trigram_jobs)
+            else:
+                _log.warning('{0.name}: Skip {1} trigram indexes'.format(
+                    lang_db, len(trigram_jobs)))
+
+    return jobs, existing
+
+
+def _log_progress(done, total, job, seconds, error):
+    if error is None:
+        _log.info('[{0}/{1}] {2!r} built in {3:.1f}s'.format(
+            done, total, job, seconds))
+    else:
+        _log.error('[{0}/{1}] {2!r} failed after {3:.1f}s: {4}'.format(
+            done, total, job, seconds, error))
+
+
+def build_indexes(databases, workers, tables=None, concurrently=False,
+                  trigram=True, progress=None):
+    """Build the missing primary keys and indexes of all databases.
+
+    :param databases:       Registry of the databases
+    :type databases:        mwdb.orm.database.Databases
+
+    :param workers:         Number of indexes built at the same time. Should
+                            match the number of cores of the database
+                            server, which PostgreSQL does not report.
+    :type workers:          int
+
+    :param tables:          Names of the tables. Defaults to all tables with
+                            index definitions.
+    :type tables:           sequence
+
+    :param concurrently:    Use CREATE INDEX CONCURRENTLY, so the tables stay
+                            writable while indexes are built
+    :type concurrently:     bool
+
+    :param trigram:         Build trigram indexes
+    :type trigram:          bool
+
+    :param progress:        Function called with (done, total, job, seconds,
+                            error message) after every job. Defaults to
+                            logging.
+    :type progress:         callable
+
+    :return:                Dictionary with the numbers of built and skipped
+                            indexes and a list of (job, error message) tuples
+                            of failed jobs
+    :rtype:                 dict
+    """
+    if progress is None:
+        progress = _log_progress
+
+    jobs, existing = collect_jobs(databases, tables, concurrently, trigram)
+    _log.debug('Build {0} indexes with {1} workers, skip {2}'.format(
+        len(jobs), workers, existing))
+
+    ready = []
+    blocked = {}
+    pkeys = set((job.database.name, job.table) for job in jobs
+                if job.kind == 'pkey')
+
+    for seq, job in enumerate(jobs):
+        key = (job.database.name, job.table)
+        if job.kind == 'index' and key in pkeys:
+            blocked.setdefault(key, []).append((-job.size, seq, job))
+        else:
+            ready.append((-job.size, seq, job))
+    heapq.heapify(ready)
+
+    state = {'running': 0, 'done': 0, 'built': 0}
+    failed = []
+    cond = threading.Condition()
+
+    def work():
+        while True:
+            with cond:
+                while not ready and state['running']:
+                    cond.wait()
+                if not ready:
+                    return
+                job = heapq.heappop(ready)[2]
+                state['running'] += 1
+
+            start = time.time()
+            error = None
+            try:
+                job.run()
+            except Exception as err:
+                error = '{0}: {1}'.format(err.__class__.__name__, err)
+
+            with cond:
+                state['running'] -= 1
+                state['done'] += 1
+
+                if error is None:
+                    state['built'] += 1
+                else:
+                    failed.append((job, error))
+
+                if job.kind == 'pkey':
+                    for item in blocked.pop((job.database.name, job.table),
+                                            []):
+                        heapq.heappush(ready, item)
+
+                progress(state['done'], len(jobs), job, time.time() - start,
+                         error)
+                cond.notify_all()
+
+    threads = [threading.Thread(target=work) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for lang_db in set(job.database for job in jobs):
+        lang_db.reflect()
+
+    return {'built': state['built'],
+            'skipped': existing,
+            'failed': failed}
@@ -28,18 +28,27 @@ from sqlalchemy.sql import *
 
 from mwdb.mediawiki.pages import Page, Article, Template, Category
 from mwdb.mediawiki.pages import PageLink, CategoryLink, LanguageLink
+from mwdb.mediawiki.pages import Redirect
 from mwdb.mediawiki.text import PageText, Revision
 
 _log = logging.getLogger(__name__)
 
 
-def init_mappers(metadata, language):
+def init_mappers(metadata, language, defer_text=False):
+    """Create mapped classes for given language.
+
+    :param defer_text:  Load the text column of PageText objects only when
+                        it is accessed
+    :type defer_text:   bool
+    """
     pages = metadata.tables['page']
     texts = metadata.tables['text']
     pagelinks = metadata.tables['pagelinks']
     catlinks = metadata.tables['categorylinks']
     langlinks = metadata.tables['langlinks']
     revisions = metadata.tables['revision']
+    # older databases might lack the redirect table
+    redirects = metadata.tables.get('redirect')
 
     # you might think wtf now... but do not fear and have a look at:
     # http://www.sqlalchemy.org/trac/wiki/UsageRecipes/EntityName
@@ -97,6 +106,12 @@ def init_mappers(metadata, language):
                                     (LanguageLink, ), {})
     LanguageLink.language = language
 
+    Redirect_cls = type.__new__(type,
+                                b'{0}_{1}'.format(language.upper(),
+                                                  'Redirect'),
+                                (Redirect, ), {})
+    Redirect_cls.language = language
+
     #Class-Dictionary:
     classes = {'Page': Page_cls,
                'Article': Article_cls,
@@ -107,15 +122,19 @@ def init_mappers(metadata, language):
                'PageText': PageText_cls,
                'Revision': Revision_cls}
 
+    if redirects is not None:
+        classes['Redirect'] = Redirect_cls
+
     _log.debug('{0}: Map {1}_Page'.format(language, language.upper()))
     page_m = mapper(Page_cls, pages,
                     include_properties = ['id', 'namespace', 'title',
-                                          'is_redirect', 'text'],
+                                          'is_redirect', 'latest_id', 'text'],
                     properties = {
                         'id': pages.c.page_id,
                         'namespace': pages.c.page_namespace,
                         'title': pages.c.page_title,
                         'is_redirect': pages.c.page_is_redirect,
+                        'latest_id': pages.c.page_latest,
                         'categories': relation(
                             Category_cls,
                             secondary = catlinks,
@@ -176,6 +195,13 @@ def init_mappers(metadata, language):
                         polymorphic_on = pages.c.page_namespace,
                         polymorphic_identity = -42)
 
+    if redirects is not None:
+        page_m.add_property('redirect', relation(
+            Redirect_cls,
+            primaryjoin = pages.c.page_id == redirects.c.rd_from,
+            foreign_keys = [redirects.c.rd_from],
+            uselist = False))
+
     _log.debug('{0}: Map {1}_Article'.format(language, language.upper()))
     article_m = mapper(Article_cls,
                        inherits = page_m,
@@ -250,12 +276,42 @@ def init_mappers(metadata, language):
                          primary_key = [langlinks.c.ll_from,
                                         langlinks.c.ll_lang])
 
+    if redirects is not None:
+        _log.debug('{0}: Map {1}_Redirect'.format(language, language.upper()))
+        redirect_m = mapper(Redirect_cls,
+                            redirects,
+                            properties = {
+                                'source_id': redirects.c.rd_from,
+                                'namespace': redirects.c.rd_namespace,
+                                'title': redirects.c.rd_title,
+                                'target': relation(
+                                    Page_cls,
+                                    primaryjoin = and_(
+                                        pages.c.page_namespace == redirects.c.rd_namespace,
+                                        pages.c.page_title == redirects.c.rd_title),
+                                    foreign_keys = [redirects.c.rd_namespace,
+                                                    redirects.c.rd_title],
+                                    uselist = False),
+                                'source_page': relation(
+                                    Page_cls,
+                                    primaryjoin = redirects.c.rd_from == pages.c.page_id,
+                                    foreign_keys = [redirects.c.rd_from],
+                                    uselist = False)},
+                            primary_key = [redirects.c.rd_from])
+
     _log.debug('{0}: Map {1}_PageText'.format(language, language.upper()))
+    if defer_text:
+        text_column = deferred(texts.c.old_text)
+    else:
+        text_column = texts.c.old_text
+
+    # PageText.text decodes data according to flags
     text_m = mapper(PageText_cls,
                     texts,
                     properties = {
                         'id': texts.c.old_id,
-                        'text': texts.c.old_text})
+                        'data': text_column,
+                        'flags': texts.c.old_flags})
 
     _log.debug('{0}: Map {1}_Revision'.format(language, language.upper()))
     revision_m = mapper(Revision_cls,
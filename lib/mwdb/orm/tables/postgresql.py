@@ -58,17 +58,53 @@ pkey_columns = {'querycache_info': ['qci_type'],
                 'watchlist': ['wl_user', 'wl_namespace', 'wl_title']}
 
 # indexed columns
-# list of tuples - each tuple represents one index
-indexed_columns = {'categorylinks': [('cl_to',), ('cl_from',)],
-                   'page': [('page_title',), ('page_namespace',),
-                            ('page_latest',), ('page_namespace',
-                                               'page_title')],
+# list of index definitions - a tuple of column names represents a plain
+# index, a dictionary a partial, expression or covering index with the keys:
+#   name:       index name (required)
+#   columns:    column names or expressions, which may carry an operator
+#               class, e.g. 'reverse(page_title) text_pattern_ops' (required)
+#   include:    columns stored in the index but not indexed, so index only
+#               scans can return them. They are left out before PostgreSQL
+#               11, which leaves a plain index on columns.
+#   where:      predicate of a partial index
+#   using:      index method, e.g. 'gin' (defaults to btree)
+#
+# The categories and member_pages relations and get_category join
+# categorylinks in both directions. The covering categorylinks indexes
+# return the other end of a link without reading the table, so the
+# categorylinks side of these joins runs as an index only scan.
+# Titles of articles and categories are looked up through partial indexes,
+# which are much smaller than an index on the titles of all pages. The
+# (page_namespace, page_title) index serves the other namespaces and the
+# redirect joins, whose namespace is not known in advance. The index on the
+# reversed title serves suffix searches written as
+# reverse(page_title) LIKE 'x%'.
+indexed_columns = {'categorylinks': [{'name': 'cl_to_include_from',
+                                      'columns': ('cl_to', ),
+                                      'include': ('cl_from', )},
+                                     {'name': 'cl_from_include_to',
+                                      'columns': ('cl_from', ),
+                                      'include': ('cl_to', )}],
+                   'page': [('page_namespace',), ('page_latest',),
+                            ('page_namespace', 'page_title'),
+                            {'name': 'page_article_title',
+                             'columns': ('page_title', ),
+                             'where': 'page_namespace = 0'},
+                            {'name': 'page_category_title',
+                             'columns': ('page_title', ),
+                             'where': 'page_namespace = 14'},
+                            {'name': 'page_title_reverse',
+                             'columns': ('reverse(page_title) '
+                                         'text_pattern_ops', )}],
                    'text': [('old_id',)],
                    'langlinks': [('ll_from',)],
                    'pagelinks': [('pl_namespace', 'pl_from'), ('pl_namespace',
                                                                'pl_title')],
                    'revision': [('rev_text_id',), ('rev_page',)]}
 
+# columns with trigram GIN indexes (pg_trgm), which serve LIKE '%x%'
+trigram_indexed_columns = {'page': ['page_title']}
+
 ar_t = Table('archive', metadata,
              Column('ar_namespace', SmallInteger, nullable=False,
                     server_default='0'),
@@ -82,7 +82,13 @@ class SiteInformation(object):
     def _read_information(self):
         """Read information from siteinfo json files"""
 
-        for fp_path in glob.iglob(os.path.join(build_info.DATA_DIR, 'mwdb',
+        # build_info is only filled in when mwdb is built by setup.py
+        data_dir = getattr(build_info, 'DATA_DIR', None)
+        if data_dir is None:
+            _log.warning('mwdb is not installed, no site information read')
+            return
+
+        for fp_path in glob.iglob(os.path.join(data_dir, 'mwdb',
                                                'siteinfo', '*.json')):
             _log.debug('Reading site information from: {0}'.format(fp_path))
             try:
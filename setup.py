@@ -49,6 +49,7 @@ setup(name='mwdb',
       packages=['mwdb', 'mwdb.orm', 'mwdb.orm.tables', 'mwdb.mediawiki',
                ],
       package_dir = { '':'lib' },
+      test_suite='tests',
       cmdclass={'build_py': build_py },
       classifiers=[
           'Development Status :: 3 - Alpha',
@@ -0,0 +1,34 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the parts of mwdb that do not need a database server.
+
+Run with ``python setup.py test`` or ``python -m unittest discover`` from the
+top of the source tree.
+"""
+
+import os.path
+import sys
+
+# test the sources in lib instead of an installed mwdb
+_lib_dir = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'lib')
+
+if _lib_dir not in sys.path:
+    sys.path.insert(0, _lib_dir)
@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+from mwdb.orm import advisor
+
+# plan of a category members query as returned by EXPLAIN (FORMAT JSON)
+_plan = {
+    'Node Type': 'Hash Join',
+    'Hash Cond': '(cl.cl_from = p.page_id)',
+    'Plans': [
+        {'Node Type': 'Seq Scan',
+         'Relation Name': 'categorylinks',
+         'Alias': 'cl',
+         'Filter': "((cl_to)::text = 'Physiker'::text)"},
+        {'Node Type': 'Hash',
+         'Plans': [
+             {'Node Type': 'Index Scan',
+              'Relation Name': 'page',
+              'Alias': 'p',
+              'Index Cond': '(page_namespace = 0)'}]}]}
+
+
+class SeqScanTest(unittest.TestCase):
+
+    def test_seq_scans(self):
+        scans = list(advisor._iter_seq_scans(_plan))
+
+        self.assertEqual(len(scans), 1)
+        node, conditions = scans[0]
+        self.assertEqual(node['Relation Name'], 'categorylinks')
+        self.assertEqual(conditions, ('(cl.cl_from = p.page_id)', ))
+
+    def test_conditions_of_all_parents(self):
+        plan = {'Node Type': 'Nested Loop',
+                'Join Filter': '(a.x = b.y)',
+                'Plans': [_plan]}
+        node, conditions = list(advisor._iter_seq_scans(plan))[0]
+
+        self.assertEqual(conditions, ('(a.x = b.y)',
+                                      '(cl.cl_from = p.page_id)'))
+
+    def test_no_seq_scans(self):
+        self.assertEqual(
+            list(advisor._iter_seq_scans(_plan['Plans'][1])), [])
+
+
+class MentionedColumnsTest(unittest.TestCase):
+
+    def test_filter(self):
+        self.assertEqual(
+            advisor._mentioned_columns(
+                "((page_title = 'Hamburg') AND (page_namespace = 0))",
+                'page'),
+            ['page_title', 'page_namespace'])
+
+    def test_alias(self):
+        # only the columns of the aliased table are reported
+        self.assertEqual(
+            advisor._mentioned_columns(
+                '((cl.cl_to = p.page_title) AND (cl.cl_from > 10))',
+                'categorylinks', 'cl'),
+            ['cl_to', 'cl_from'])
+        self.assertEqual(
+            advisor._mentioned_columns('(cl.cl_from = p.page_id)',
+                                       'categorylinks', 'p'), [])
+
+    def test_no_condition(self):
+        self.assertEqual(advisor._mentioned_columns(None, 'page'), [])
+        self.assertEqual(advisor._mentioned_columns('(x = 1)', 'page'), [])
+
+
+class SuggestionsTest(unittest.TestCase):
+
+    def finding(self, table, columns):
+        return advisor.Finding('SELECT 1', table, 10 ** 6, 1.0, columns)
+
+    def test_suggest_missing_indexes(self):
+        self.assertEqual(
+            advisor.suggest_indexed_columns([
+                self.finding('categorylinks', ('cl_sortkey', )),
+                self.finding('categorylinks', ('cl_sortkey', )),
+                self.finding('page', ('page_is_redirect', ))]),
+            {'categorylinks': [('cl_sortkey', )],
+             'page': [('page_is_redirect', )]})
+
+    def test_defined_indexes(self):
+        self.assertEqual(
+            advisor.suggest_indexed_columns([
+                self.finding('categorylinks', ('cl_to', )),
+                self.finding('page', ('page_namespace', 'page_title')),
+                self.finding('page', ())]),
+            {})
+
+
+if __name__ == '__main__':
+    unittest.main()
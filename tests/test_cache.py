@@ -0,0 +1,165 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mwdb.orm import cache
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_get_and_set(self):
+        lru = cache.LRUCache(2)
+        lru['a'] = 1
+
+        self.assertEqual(lru['a'], 1)
+        self.assertEqual(lru.get('b'), None)
+        self.assertEqual(lru.get('b', 2), 2)
+        self.assertTrue('a' in lru)
+        self.assertFalse('b' in lru)
+
+    def test_missing_key(self):
+        lru = cache.LRUCache(2)
+        self.assertRaises(KeyError, lambda: lru['a'])
+
+    def test_evicts_least_recently_used(self):
+        lru = cache.LRUCache(2)
+        lru['a'] = 1
+        lru['b'] = 2
+
+        # a is now used more recently than b
+        lru['a']
+        lru['c'] = 3
+
+        self.assertEqual(len(lru), 2)
+        self.assertTrue('a' in lru)
+        self.assertFalse('b' in lru)
+        self.assertTrue('c' in lru)
+
+    def test_overwrite_marks_as_used(self):
+        lru = cache.LRUCache(2)
+        lru['a'] = 1
+        lru['b'] = 2
+        lru['a'] = 3
+        lru['c'] = 4
+
+        self.assertEqual(lru['a'], 3)
+        self.assertFalse('b' in lru)
+
+    def test_disabled(self):
+        lru = cache.LRUCache(0)
+        lru['a'] = 1
+
+        self.assertEqual(len(lru), 0)
+        self.assertEqual(lru.get('a'), None)
+
+    def test_delete_and_clear(self):
+        lru = cache.LRUCache(3)
+        lru['a'] = 1
+        lru['b'] = 2
+
+        del lru['a']
+        self.assertFalse('a' in lru)
+
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+
+    def test_stats(self):
+        lru = cache.LRUCache(1)
+        lru['a'] = 1
+        lru.get('a')
+        lru.get('b')
+        lru['b'] = 2
+
+        self.assertEqual(lru.stats, {'hits': 1, 'misses': 1, 'evictions': 1,
+                                     'size': 1})
+
+
+class TextCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'texts.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_and_set(self):
+        texts = cache.TextCache(self.path)
+        texts.set('enwiki', 1, 'Ümlaut')
+
+        self.assertEqual(texts.get('enwiki', 1), 'Ümlaut')
+        self.assertEqual(texts.get('dewiki', 1), None)
+        self.assertEqual(texts.get('enwiki', 2, ''), '')
+
+    def test_shared_file(self):
+        cache.TextCache(self.path).set('enwiki', 1, 'text')
+        self.assertEqual(cache.TextCache(self.path).get('enwiki', 1), 'text')
+
+    def test_evicts_least_recently_used(self):
+        texts = cache.TextCache(self.path, max_bytes=10, low_water=0.5,
+                                touch_interval=0)
+        texts.set('enwiki', 1, 'aaaa')
+        time.sleep(0.01)
+        texts.set('enwiki', 2, 'bbbb')
+        time.sleep(0.01)
+
+        # text 1 is now used more recently than text 2
+        texts.get('enwiki', 1)
+        texts.set('enwiki', 3, 'cccc')
+
+        self.assertEqual(texts.get('enwiki', 2), None)
+        self.assertEqual(texts.get('enwiki', 3), 'cccc')
+        self.assertTrue(texts.stats['bytes'] <= 10)
+        self.assertTrue(texts.stats['evictions'] >= 1)
+
+    def test_text_larger_than_cache(self):
+        texts = cache.TextCache(self.path, max_bytes=3)
+        texts.set('enwiki', 1, 'four')
+
+        self.assertEqual(texts.get('enwiki', 1), None)
+
+    def test_stats(self):
+        texts = cache.TextCache(self.path)
+        texts.set('enwiki', 1, 'ä')
+        texts.get('enwiki', 1)
+        texts.get('enwiki', 2)
+
+        self.assertEqual(texts.stats, {'hits': 1, 'misses': 1,
+                                       'hit_rate': 0.5, 'evictions': 0,
+                                       'size': 1, 'bytes': 2})
+
+    def test_clear(self):
+        texts = cache.TextCache(self.path)
+        texts.set('enwiki', 1, 'text')
+        texts.clear()
+
+        self.assertEqual(texts.get('enwiki', 1), None)
+        self.assertEqual(texts.stats['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
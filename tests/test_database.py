@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+from mwdb import exceptions
+from mwdb.orm import database
+from mwdb.orm.tables import postgresql as postgresql_tables
+
+
+class _PostgreSQLDatabase(database.PostgreSQLDatabase):
+    """PostgreSQL database of a given server version that never connects"""
+
+    def __init__(self, server_version):
+        super(_PostgreSQLDatabase, self).__init__(
+            'psycopg2', 'user', 'password', 'localhost', 'enwiki_20100130',
+            'en')
+        self.server_version = server_version
+
+    def _server_version(self):
+        return self.server_version
+
+
+class IndexStatementsTest(unittest.TestCase):
+
+    def statements(self, table_name, server_version=(11, 2)):
+        return dict(_PostgreSQLDatabase(
+            server_version)._new_index_statements(table_name))
+
+    def test_covering_index(self):
+        self.assertEqual(
+            self.statements('categorylinks')['cl_to_include_from'],
+            'CREATE INDEX IF NOT EXISTS cl_to_include_from ON "categorylinks" '
+            '(cl_to) INCLUDE (cl_from)')
+
+    def test_covering_index_before_postgresql_11(self):
+        self.assertEqual(
+            self.statements('categorylinks', (10, 5))['cl_from_include_to'],
+            'CREATE INDEX IF NOT EXISTS cl_from_include_to ON "categorylinks" '
+            '(cl_from)')
+
+    def test_partial_index(self):
+        self.assertEqual(
+            self.statements('page')['page_category_title'],
+            'CREATE INDEX IF NOT EXISTS page_category_title ON "page" '
+            '(page_title) WHERE page_namespace = 14')
+
+    def test_expression_index(self):
+        self.assertEqual(
+            self.statements('page')['page_title_reverse'],
+            'CREATE INDEX IF NOT EXISTS page_title_reverse ON "page" '
+            '(reverse(page_title) text_pattern_ops)')
+
+    def test_existing_indexes_before_postgresql_9_5(self):
+        self.assertEqual(
+            self.statements('page', (9, 4))['page_article_title'],
+            'CREATE INDEX page_article_title ON "page" (page_title) '
+            'WHERE page_namespace = 0')
+
+    def test_column_indexes_are_skipped(self):
+        self.assertEqual(self.statements('text'), {})
+        self.assertEqual(self.statements('user'), {})
+
+    def test_index_method(self):
+        indexed_columns = postgresql_tables.indexed_columns
+        postgresql_tables.indexed_columns = {'page': [
+            {'name': 'page_title_gin', 'columns': ('page_title', ),
+             'using': 'gin'}]}
+        try:
+            self.assertEqual(
+                self.statements('page'),
+                {'page_title_gin': 'CREATE INDEX IF NOT EXISTS page_title_gin '
+                                   'ON "page" USING gin (page_title)'})
+        finally:
+            postgresql_tables.indexed_columns = indexed_columns
+
+    def test_invalid_definition(self):
+        indexed_columns = postgresql_tables.indexed_columns
+        postgresql_tables.indexed_columns = {'page': [{'name': 'page_x'}]}
+        try:
+            self.assertRaises(exceptions.IndexError, self.statements, 'page')
+        finally:
+            postgresql_tables.indexed_columns = indexed_columns
+
+    def test_trigram_index(self):
+        self.assertEqual(
+            _PostgreSQLDatabase((11, 2))._new_search_index_statements('page'),
+            [('page_title_trgm', 'CREATE INDEX IF NOT EXISTS page_title_trgm '
+                                 'ON "page" USING gin (page_title '
+                                 'gin_trgm_ops)')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import with_statement
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mwdb.mediawiki import graph
+
+# 0 -> 1, 0 -> 2, 2 -> 0, 2 -> 1, 3 has no links
+_sources = [2, 0, 2, 0]
+_targets = [1, 2, 0, 1]
+_titles = ['Hamburg', 'Bremen', 'Straße', 'Kiel']
+
+
+class GraphTestCase(unittest.TestCase):
+    """Runs every test with and without NumPy"""
+
+    def run(self, result=None):
+        numpy = graph.numpy
+
+        for module in set([None, numpy]):
+            graph.numpy = module
+            try:
+                super(GraphTestCase, self).run(result)
+            finally:
+                graph.numpy = numpy
+
+    def link_graph(self):
+        out_offsets, out_targets = graph._csr(4, _sources, _targets)
+        in_offsets, in_targets = graph._csr(4, _targets, _sources)
+        return graph.LinkGraph(graph._int32_array([10, 20, 30, 40]), _titles,
+                               out_offsets, out_targets, in_offsets,
+                               in_targets)
+
+
+class CSRTest(GraphTestCase):
+
+    def test_offsets(self):
+        offsets, targets = graph._csr(4, _sources, _targets)
+        self.assertEqual(list(offsets), [0, 2, 2, 4, 4])
+
+    def test_targets_grouped_by_source(self):
+        offsets, targets = graph._csr(4, _sources, _targets)
+        self.assertEqual(sorted(targets[0:2]), [1, 2])
+        self.assertEqual(sorted(targets[2:4]), [0, 1])
+
+    def test_no_links(self):
+        offsets, targets = graph._csr(2, [], [])
+
+        self.assertEqual(list(offsets), [0, 0, 0])
+        self.assertEqual(len(targets), 0)
+
+
+class LinkGraphTest(GraphTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'enwiki.linkgraph')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_links(self):
+        link_graph = self.link_graph()
+
+        self.assertEqual(len(link_graph), 4)
+        self.assertEqual(link_graph.link_count, 4)
+        self.assertEqual(link_graph.index('Straße'), 2)
+        self.assertEqual(link_graph.index('Berlin'), None)
+        self.assertEqual(sorted(link_graph.successors(2)), [0, 1])
+        self.assertEqual(sorted(link_graph.predecessors(1)), [0, 2])
+        self.assertEqual(len(link_graph.successors(3)), 0)
+
+    def test_save_and_load(self):
+        link_graph = self.link_graph()
+        link_graph.save(self.path)
+        loaded = graph.LinkGraph.load(self.path)
+
+        self.assertEqual(loaded.titles, _titles)
+        for name in ('page_ids', 'out_offsets', 'out_targets', 'in_offsets',
+                     'in_targets'):
+            self.assertEqual(list(getattr(loaded, name)),
+                             list(getattr(link_graph, name)))
+
+        # no temporary files are left behind
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['enwiki.linkgraph', 'enwiki.linkgraph.titles'])
+
+    def test_truncated_arrays(self):
+        self.link_graph().save(self.path)
+
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(os.path.getsize(self.path) - 4)
+
+        self.assertRaises(ValueError, graph.LinkGraph.load, self.path)
+
+    def test_truncated_titles(self):
+        self.link_graph().save(self.path)
+
+        with open(self.path + '.titles', 'r+b') as fp:
+            fp.truncate(len('Hamburg\n'))
+
+        self.assertRaises(ValueError, graph.LinkGraph.load, self.path)
+
+    def test_not_a_graph(self):
+        for data in (b'', b'MWDBCSR0' + b'\0' * 16):
+            with open(self.path, 'wb') as fp:
+                fp.write(data)
+
+            self.assertRaises(ValueError, graph.LinkGraph.load, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import unittest
+
+from mwdb.orm import importer
+
+_categorylinks_dump = '''\
+-- MySQL dump 10.11
+CREATE TABLE `categorylinks` (
+  `cl_from` int(8) unsigned NOT NULL default '0',
+  `cl_to` varbinary(255) NOT NULL default '',
+  `cl_sortkey` varbinary(70) NOT NULL default '',
+  `cl_sortkey_prefix` varbinary(255) NOT NULL default '',
+  `cl_timestamp` timestamp NOT NULL,
+  `cl_collation` varbinary(32) NOT NULL default ''
+) ENGINE=InnoDB DEFAULT CHARSET=binary;
+INSERT INTO `categorylinks` VALUES (12,'Physiker','Einstein, Albert','',\
+'20100130120000','uppercase'),(13,'Straße','A\\'s\\ttab','',\
+'20100130120001','uppercase');
+INSERT INTO `langlinks` VALUES (12,'de','Albert Einstein');
+'''
+
+
+class _Queue(object):
+    """Queue that keeps all batches"""
+
+    def __init__(self):
+        self.batches = []
+
+    def put(self, batch):
+        self.batches.append(batch)
+
+
+def _rows(line):
+    return list(importer._iter_sql_rows(line, line.index(' VALUES ') + 8))
+
+
+class SQLTokenizerTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(
+            _rows("INSERT INTO `page` VALUES (1,0,'Hamburg',NULL,0.5);"),
+            [['1', '0', 'Hamburg', None, '0.5']])
+
+    def test_several_rows(self):
+        self.assertEqual(
+            _rows("INSERT INTO `redirect` VALUES (1,0,'A'),(2,14,'B');"),
+            [['1', '0', 'A'], ['2', '14', 'B']])
+
+    def test_separators_in_strings(self):
+        self.assertEqual(
+            _rows("INSERT INTO `page` VALUES (1,'a,b (c);','NULL');"),
+            [['1', 'a,b (c);', 'NULL']])
+
+    def test_escapes(self):
+        self.assertEqual(
+            _rows(r"INSERT INTO `text` VALUES (1,'it\'s \"x\"\\\n\t\0');"),
+            [['1', 'it\'s "x"\\\n\t']])
+
+    def test_empty_string(self):
+        self.assertEqual(_rows("INSERT INTO `page` VALUES (1,'');"),
+                         [['1', '']])
+
+    def test_unescape(self):
+        self.assertEqual(importer._unescape(r'a\Zb\%c'), 'a\x1ab%c')
+
+
+class CopyFormatTest(unittest.TestCase):
+
+    def test_copy_field(self):
+        self.assertEqual(importer._copy_field(None), '\\N')
+        self.assertEqual(importer._copy_field(42), '42')
+        self.assertEqual(importer._copy_field('a\\b\tc\nd\re'),
+                         'a\\\\b\\tc\\nd\\re')
+
+    def test_timestamp(self):
+        self.assertEqual(importer._timestamp('20100130120000'),
+                         '2010-01-30 12:00:00+00')
+        self.assertEqual(importer._timestamp('2010-01-30 12:00:00'),
+                         '2010-01-30 12:00:00')
+        self.assertEqual(importer._timestamp(None), None)
+
+    def test_batches(self):
+        queue = _Queue()
+        batches = importer._Batches(queue, 2)
+        for page_id in range(3):
+            batches.add('redirect', ('rd_from', 'rd_title'), (page_id, 'A'))
+        batches.flush()
+
+        self.assertEqual(queue.batches, [
+            ('redirect', ('rd_from', 'rd_title'), b'0\tA\n1\tA\n', 2),
+            ('redirect', ('rd_from', 'rd_title'), b'2\tA\n', 1)])
+        self.assertEqual(batches.counts, {'redirect': 3})
+
+
+class SQLDumpTest(unittest.TestCase):
+
+    def test_parse(self):
+        queue = _Queue()
+        batches = importer._Batches(queue, 100)
+        importer._parse_sql_dump(
+            io.BytesIO(_categorylinks_dump.encode('utf8')),
+            ('categorylinks', ), batches)
+        batches.flush()
+
+        # dump columns are matched by name, unknown columns are dropped
+        self.assertEqual(queue.batches, [(
+            'categorylinks', ('cl_from', 'cl_to', 'cl_sortkey', 'cl_timestamp'),
+            '12\tPhysiker\tEinstein, Albert\t2010-01-30 12:00:00+00\n'
+            '13\tStraße\tA\'s\\ttab\t2010-01-30 12:00:01+00\n'.encode('utf8'),
+            2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
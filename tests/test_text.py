@@ -0,0 +1,135 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+import zlib
+
+from mwdb import exceptions
+from mwdb.mediawiki import text
+
+_text = 'Ein Text über [[Straße]]n.\n' * 100
+
+
+def _deflate(data):
+    """Raw deflate stream as written by MediaWiki"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _slices(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class DecodeTextTest(unittest.TestCase):
+
+    def test_plain(self):
+        self.assertEqual(text.decode_text(_text, 'utf-8'), _text)
+        self.assertEqual(text.decode_text(_text, None), _text)
+
+    def test_utf8_bytes(self):
+        self.assertEqual(text.decode_text(_text.encode('utf8'), 'utf-8'),
+                         _text)
+
+    def test_legacy_encoding(self):
+        self.assertEqual(text.decode_text(_text.encode('latin-1'), ''), _text)
+
+    def test_gzip(self):
+        data = _deflate(_text.encode('utf8'))
+
+        self.assertEqual(text.decode_text(data, 'utf-8,gzip'), _text)
+        # compressed data read from a text column arrives as unicode
+        self.assertEqual(text.decode_text(data.decode('latin-1'),
+                                          'gzip, utf-8'), _text)
+
+    def test_encode_round_trip(self):
+        for compress in (False, True):
+            data, flags = text.encode_text(_text, compress)
+            self.assertEqual(text.decode_text(data, flags), _text)
+
+    def test_encode_compressed(self):
+        data, flags = text.encode_text(_text, True)
+
+        self.assertEqual(flags, 'utf-8,gzip,base64')
+        self.assertTrue(len(data) < len(_text))
+
+    def test_unsupported_flags(self):
+        try:
+            text.decode_text('', 'utf-8,external', 42)
+        except exceptions.TextError as err:
+            self.assertEqual(err.text_id, 42)
+            self.assertEqual(err.flags, 'external,utf-8')
+        else:
+            self.fail('TextError not raised')
+
+    def test_corrupt_data(self):
+        try:
+            text.decode_text(b'not deflated', 'utf-8,gzip', 42)
+        except exceptions.TextError as err:
+            self.assertEqual(err.text_id, 42)
+            self.assertEqual(err.flags, 'gzip,utf-8')
+            self.assertTrue('Text 42 (gzip,utf-8)' in '{0}'.format(err))
+        else:
+            self.fail('TextError not raised')
+
+    def test_invalid_utf8(self):
+        self.assertRaises(exceptions.TextError, text.decode_text,
+                          b'\xff\xfe', 'utf-8')
+
+
+class DecodeSlicesTest(unittest.TestCase):
+
+    def decode(self, slices, flags):
+        return ''.join(text.decode_slices(slices, flags))
+
+    def test_plain(self):
+        self.assertEqual(self.decode(_slices(_text, 7), 'utf-8'), _text)
+
+    def test_split_utf8_characters(self):
+        data = _text.encode('utf8')
+        self.assertEqual(self.decode(_slices(data, 3), 'utf-8'), _text)
+
+    def test_gzip(self):
+        data = _deflate(_text.encode('utf8')).decode('latin-1')
+        self.assertEqual(self.decode(_slices(data, 5), 'utf-8,gzip'), _text)
+
+    def test_base64(self):
+        # slice sizes that cut base64 groups of four characters
+        data, flags = text.encode_text(_text, True)
+
+        for size in (1, 3, 5, 1000):
+            self.assertEqual(self.decode(_slices(data, size), flags), _text)
+
+    def test_unsupported_flags(self):
+        self.assertRaises(exceptions.TextError, self.decode, [''], 'object')
+
+    def test_corrupt_data(self):
+        try:
+            self.decode([b'not ', b'deflated'], 'utf-8,gzip')
+        except exceptions.TextError as err:
+            self.assertEqual(err.flags, 'gzip,utf-8')
+        else:
+            self.fail('TextError not raised')
+
+
+if __name__ == '__main__':
+    unittest.main()
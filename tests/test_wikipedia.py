@@ -0,0 +1,79 @@
+# -*- coding: UTF-8 -*-
+
+# © Copyright 2009 Wolodja Wentland and Johannes Knopp.
+# All Rights Reserved.
+
+# This file is part of mwdb.
+#
+# mwdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mwdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with mwdb. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+from mwdb.mediawiki import wikipedia
+
+
+class _LanguageDatabase(object):
+    """Language database that is never connected"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Article(object):
+    pass
+
+
+class KeysetScanTest(unittest.TestCase):
+
+    def scan(self, db_name='enwiki_20100130', checkpoint=None):
+        return wikipedia.KeysetScan(_LanguageDatabase(db_name), _Article,
+                                    checkpoint=checkpoint)
+
+    def test_new_scan(self):
+        scan = self.scan()
+
+        self.assertEqual(scan.last_id, None)
+        self.assertEqual(self.scan(checkpoint=scan.checkpoint).last_id, None)
+
+    def test_resume(self):
+        scan = self.scan()
+        scan.last_id = 4711
+
+        resumed = self.scan(checkpoint=scan.checkpoint)
+        self.assertEqual(resumed.last_id, 4711)
+        self.assertEqual(resumed.checkpoint, scan.checkpoint)
+
+    def test_checkpoint_is_opaque_text(self):
+        scan = self.scan()
+        scan.last_id = 4711
+
+        self.assertTrue(isinstance(scan.checkpoint, type('')))
+        self.assertFalse('4711' in scan.checkpoint)
+
+    def test_other_database(self):
+        scan = self.scan('dewiki_20100130')
+        scan.last_id = 4711
+
+        self.assertRaises(ValueError, self.scan, 'enwiki_20100130',
+                          scan.checkpoint)
+
+    def test_invalid_checkpoint(self):
+        for checkpoint in ('', 'not a checkpoint', 'ZW53aWtp'):
+            self.assertRaises(ValueError, self.scan, checkpoint=checkpoint)
+
+
+if __name__ == '__main__':
+    unittest.main()